@@ -5,14 +5,13 @@ import sys
 import time
 import uuid
 
-import aiohttp
 import asyncio
 
 from dotenv import load_dotenv
 from pathlib import Path
 
 from collector.config import CollectorConfiguration
-from collector.interface import Scraper, VorgangsScraper, SitzungsScraper
+from collector.tesseract_wrapper import remove_legacy_cache, set_ocr_backend
 
 load_dotenv()
 
@@ -21,8 +20,6 @@ logger = logging.getLogger("collector")
 errfile_logger = logging.getLogger("collector_extraction")
 parsewr_logger = logging.getLogger("collector_scraper")
 
-import litellm
-
 llmlog = logging.getLogger("LiteLLM")
 llmlog.setLevel(logging.WARNING)
 
@@ -31,15 +28,50 @@ llmlog.setLevel(logging.WARNING)
 ### end global logging setup
 
 
+# the scrapers and what they depend on (aiohttp, openapi_client, kreuzberg, ...) are
+# only imported once a cycle starts, so e.g. --dump-config returns immediately.
+# collector/tests/test_importtime.py keeps it that way
 async def main(config: CollectorConfiguration):
     global logger
+    from collector.pdf_extraction import create_extraction_pool
 
     logger.info("Starting new Scraping Cycle")
+    # one extraction pool shared by all scrapers of this cycle
+    config.extraction_executor = create_extraction_pool(
+        config.extraction_pool_kind, config.extraction_workers
+    )
+    try:
+        await run_scrapers(config)
+    finally:
+        config.extraction_executor.shutdown(cancel_futures=True)
+        config.extraction_executor = None
+        config.cache.log_hit_rates()
+        await config.cache.close()
+
+
+# --cache-report: what the cache holds per key prefix, largest first
+async def report_cache(config: CollectorConfiguration):
+    try:
+        report = await config.cache.memory_report()
+    finally:
+        await config.cache.close()
+    logger.info(f"{'prefix':<16}{'keys':>10}{'KiB':>14}{'no ttl':>10}")
+    for prefix, (count, nbytes, persistent) in sorted(
+        report.items(), key=lambda entry: -entry[1][1]
+    ):
+        logger.info(
+            f"{prefix or '(none)':<16}{count:>10}{nbytes / 1024:>14.1f}{persistent:>10}"
+        )
+
+
+async def run_scrapers(config: CollectorConfiguration):
+    import aiohttp
+
     # Load all the scrapers from the scrapers dir
     async with aiohttp.ClientSession(
         connector=aiohttp.TCPConnector(limit_per_host=1)
     ) as session:
-        scrapers: list[Scraper] = load_scrapers(config, session)
+        scrapers = load_scrapers(config, session)
         scraper_tasks = []
         for scraper in scrapers:
             logger.info(f"Running scraper: {scraper.__class__.__name__}")
@@ -56,6 +88,8 @@ async def main(config: CollectorConfiguration):
 
 
 def load_scrapers(config, session):
+    from collector.interface import VorgangsScraper, SitzungsScraper
+
     scrapers = []
     available_scrapers = []
     coll_id = uuid.UUID(config.collector_id)
@@ -113,6 +147,11 @@ if __name__ == "__main__":
 
     config = CollectorConfiguration()
     config.load()
+    remove_legacy_cache()
+    set_ocr_backend(config.ocr_backend)
+    if config.cache_report:
+        asyncio.run(report_cache(config))
+        sys.exit(0)
 
     logger.info("Starting collector manager.")
     logger.info("Configuration Complete")
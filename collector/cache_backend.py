@@ -0,0 +1,297 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import sqlite3
+import time
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger("collector")
+
+# keys per step when walking the whole keyspace, see CacheBackend.entries
+SCAN_COUNT = 1000
+# sqlite limits the number of ? in a statement
+SQLITE_MAX_VARIABLES = 500
+
+
+class CacheBackend(ABC):
+    """
+    Key value store behind ScraperCache. Values are the (possibly compressed)
+    bytes ScraperCache encoded, expiry is given in seconds with None meaning never.
+    Backends raise on connection problems, ScraperCache logs and handles them.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        assert False, "Abstract Base Method Called"
+
+    # None for the keys not found
+    @abstractmethod
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        assert False, "Abstract Base Method Called"
+
+    # wether each of the keys exists, without transferring the values
+    @abstractmethod
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        assert False, "Abstract Base Method Called"
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ex: Optional[int]) -> bool:
+        assert False, "Abstract Base Method Called"
+
+    # items: key -> (value, ex). Returns wether each of them was stored
+    @abstractmethod
+    async def set_many(
+        self, items: Dict[str, Tuple[bytes, Optional[int]]]
+    ) -> List[bool]:
+        assert False, "Abstract Base Method Called"
+
+    # seconds key has left, None if it does not expire or does not exist
+    @abstractmethod
+    async def ttl(self, key: str) -> Optional[int]:
+        assert False, "Abstract Base Method Called"
+
+    # walks all keys in batches of (key, bytes used, wether it expires)
+    @abstractmethod
+    def entries(self) -> AsyncIterator[List[Tuple[str, int, bool]]]:
+        assert False, "Abstract Base Method Called"
+
+    @abstractmethod
+    async def clear(self):
+        assert False, "Abstract Base Method Called"
+
+    # releases what belongs to the running loop, called at the end of every cycle
+    async def close(self):
+        pass
+
+
+class RedisBackend(CacheBackend):
+    def __init__(self, host: str, port: int, max_connections: int = 32):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.redis_client = None
+        self._client_loop = None
+        # Test connection, synchronously since there might not be a loop yet
+        with redis.Redis(host=host, port=port) as client:
+            client.ping()
+        logger.info(f"Connected to Redis at {host}:{port}")
+
+    # the client of the running event loop. All coroutines of a loop share its
+    # connection pool; as the connections are bound to the loop they were opened on,
+    # a new loop (= a new cycle) gets a new client
+    def client(self) -> redis.asyncio.Redis:
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            self._client_loop = loop
+            self.redis_client = redis.asyncio.Redis(
+                connection_pool=redis.asyncio.BlockingConnectionPool(
+                    host=self.host,
+                    port=self.port,
+                    decode_responses=False,  # values may be compressed
+                    max_connections=self.max_connections,
+                )
+            )
+        return self.redis_client
+
+    async def close(self):
+        if self._client_loop is not asyncio.get_running_loop():
+            return
+        await self.redis_client.aclose()
+        self.redis_client = None
+        self._client_loop = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client().get(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self.client().mget(keys)
+
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        async with self.client().pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.exists(key)
+            return [bool(result) for result in await pipe.execute()]
+
+    async def set(self, key: str, value: bytes, ex: Optional[int]) -> bool:
+        return bool(await self.client().set(key, value, ex=ex))
+
+    async def set_many(
+        self, items: Dict[str, Tuple[bytes, Optional[int]]]
+    ) -> List[bool]:
+        async with self.client().pipeline(transaction=False) as pipe:
+            for key, (value, ex) in items.items():
+                pipe.set(key, value, ex=ex)
+            return [bool(result) for result in await pipe.execute()]
+
+    async def ttl(self, key: str) -> Optional[int]:
+        ttl = await self.client().ttl(key)
+        return ttl if ttl >= 0 else None
+
+    # sizes come from MEMORY USAGE, or the value length where that is refused
+    async def entries(self) -> AsyncIterator[List[Tuple[str, int, bool]]]:
+        client = self.client()
+        use_memory_usage = True
+        cursor = 0
+        while True:
+            cursor, keys = await client.scan(cursor, count=SCAN_COUNT)
+            if keys:
+                sizes = None
+                if use_memory_usage:
+                    try:
+                        async with client.pipeline(transaction=False) as pipe:
+                            for key in keys:
+                                pipe.memory_usage(key)
+                            sizes = await pipe.execute()
+                    except redis.ResponseError as e:
+                        logger.info(f"MEMORY USAGE unavailable ({e}), using STRLEN")
+                        use_memory_usage = False
+                async with client.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.ttl(key)
+                        if sizes is None:
+                            pipe.strlen(key)
+                    answers = await pipe.execute(raise_on_error=False)
+                if sizes is None:
+                    ttls, sizes = answers[0::2], answers[1::2]
+                else:
+                    ttls = answers
+                yield [
+                    (
+                        key.decode("utf-8", "replace"),
+                        size if isinstance(size, int) else 0,
+                        ttl != -1,
+                    )
+                    for key, size, ttl in zip(keys, sizes, ttls)
+                ]
+            if cursor == 0:
+                return
+
+    async def clear(self):
+        await self.client().flushall()
+
+
+class SqliteBackend(CacheBackend):
+    """
+    Embedded on-disk backend for single node deployments without a Redis.
+    Entries live in a SQLite file in WAL mode. All statements run one after the
+    other on a thread of their own, so the event loop never waits for the disk.
+    Expired entries are invisible and purged when the cache is opened.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache")
+        self.connection = self.executor.submit(self.connect).result()
+        logger.info(f"Using SQLite cache at {self.path}")
+
+    def connect(self) -> sqlite3.Connection:
+        if not self.path.parent.exists():
+            logger.info(f"Creating Filepath: {self.path.parent}")
+            self.path.parent.mkdir(parents=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires REAL
+            )""")
+        connection.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        connection.commit()
+        return connection
+
+    async def run(self, f, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, f, *args)
+
+    def _mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        found = {}
+        now = time.time()
+        for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[start : start + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"""SELECT key, value FROM cache WHERE key IN ({", ".join("?" * len(chunk))})
+                AND (expires IS NULL OR expires > ?)""",
+                (*chunk, now),
+            )
+            found.update(rows)
+        return [found.get(key) for key in keys]
+
+    def _exists_many(self, keys: List[str]) -> List[bool]:
+        found = set()
+        now = time.time()
+        for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            chunk = keys[start : start + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"""SELECT key FROM cache WHERE key IN ({", ".join("?" * len(chunk))})
+                AND (expires IS NULL OR expires > ?)""",
+                (*chunk, now),
+            )
+            found.update(key for (key,) in rows)
+        return [key in found for key in keys]
+
+    def _set_many(self, items: Dict[str, Tuple[bytes, Optional[int]]]) -> List[bool]:
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                [
+                    (key, value, now + ex if ex else None)
+                    for key, (value, ex) in items.items()
+                ],
+            )
+        return [True] * len(items)
+
+    def _ttl(self, key: str) -> Optional[int]:
+        row = self.connection.execute(
+            "SELECT expires FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return max(0, int(row[0] - time.time()))
+
+    def _entries(self) -> List[Tuple[str, int, bool]]:
+        return [
+            (key, size, expires)
+            for key, size, expires in self.connection.execute(
+                """SELECT key, length(value), expires IS NOT NULL FROM cache
+                WHERE expires IS NULL OR expires > ?""",
+                (time.time(),),
+            )
+        ]
+
+    def _clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM cache")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.run(self._mget, [key]))[0]
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self.run(self._mget, keys)
+
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        return await self.run(self._exists_many, keys)
+
+    async def set(self, key: str, value: bytes, ex: Optional[int]) -> bool:
+        return (await self.run(self._set_many, {key: (value, ex)}))[0]
+
+    async def set_many(
+        self, items: Dict[str, Tuple[bytes, Optional[int]]]
+    ) -> List[bool]:
+        return await self.run(self._set_many, items)
+
+    async def ttl(self, key: str) -> Optional[int]:
+        return await self.run(self._ttl, key)
+
+    async def entries(self) -> AsyncIterator[List[Tuple[str, int, bool]]]:
+        entries = await self.run(self._entries)
+        for start in range(0, len(entries), SCAN_COUNT):
+            yield entries[start : start + SCAN_COUNT]
+
+    async def clear(self):
+        await self.run(self._clear)
@@ -1,7 +1,7 @@
-from openapi_client import Configuration
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from collector.llm_connector import LLMConnector
-from collector.scrapercache import ScraperCache
+from collector.outbox import Outbox
+from typing import TYPE_CHECKING
 from uuid import uuid4
 from argparse import ArgumentParser
 
@@ -10,9 +10,23 @@ import logging
 import sys
 import toml
 
+if TYPE_CHECKING:
+    from openapi_client import ApiClient
+
 logger = logging.getLogger("collector")
 
 
+# openapi_client loads all of its models on import, so it is only imported once
+# the configuration is actually used and not e.g. for --dump-config.
+# Keeps `from collector.config import Configuration` working
+def __getattr__(name):
+    if name in ("ApiClient", "Configuration"):
+        import openapi_client
+
+        return getattr(openapi_client, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 class ConfigProp:
     """
     This class caputures all parsing behaviour of a single config option.
@@ -65,6 +79,64 @@ class CollectorConfiguration:
                 ),
             )
         )
+        configurations.append(
+            ConfigProp(
+                "max_items_in_flight",
+                "main.max-items-in-flight",
+                "MAX_ITEMS_IN_FLIGHT",
+                "max_items_in_flight",
+                8,
+                lambda p: p.add_argument(
+                    "--max-items-in-flight",
+                    help="Maximum number of items a single scraper extracts and sends concurrently",
+                    type=int,
+                ),
+            )
+        )
+        configurations.append(
+            ConfigProp(
+                "max_documents_in_flight",
+                "main.max-documents-in-flight",
+                "MAX_DOCUMENTS_IN_FLIGHT",
+                "max_documents_in_flight",
+                4,
+                lambda p: p.add_argument(
+                    "--max-documents-in-flight",
+                    help="Maximum number of documents built concurrently for a single item",
+                    type=int,
+                ),
+            )
+        )
+        configurations.append(
+            ConfigProp(
+                "extraction_pool_kind",
+                "main.extraction-pool",
+                "EXTRACTION_POOL",
+                None,
+                "process",
+            )
+        )
+        configurations.append(
+            ConfigProp(
+                "extraction_workers",
+                "main.extraction-workers",
+                "EXTRACTION_WORKERS",
+                None,
+                os.cpu_count() or 1,
+            )
+        )
+        configurations.append(
+            ConfigProp(
+                "ocr_min_page_chars",
+                "main.ocr-min-page-chars",
+                "OCR_MIN_PAGE_CHARS",
+                None,
+                32,
+            )
+        )
+        configurations.append(
+            ConfigProp("ocr_backend", "main.ocr-backend", "OCR_BACKEND", None, "auto")
+        )
         configurations.append(
             ConfigProp("collector_id", "main.collector-uuid", "COLLECTOR_ID")
         )
@@ -84,6 +156,40 @@ class CollectorConfiguration:
         configurations.append(
             ConfigProp("cache_documents", "cache.document-cache", "DOCUMENT_CACHE")
         )
+        configurations.append(
+            ConfigProp(
+                "cache_default_ttl_min",
+                "cache.default-ttl-min",
+                "CACHE_DEFAULT_TTL_MIN",
+                None,
+                60 * 24 * 14,
+            )
+        )
+        configurations.append(
+            ConfigProp("cache_ttl_min", "cache.ttl-min", None, None, {})
+        )
+        configurations.append(
+            ConfigProp(
+                "cache_compression",
+                "cache.compression",
+                "CACHE_COMPRESSION",
+                None,
+                "auto",
+            )
+        )
+        configurations.append(
+            ConfigProp("cache_backend", "cache.backend", "CACHE_BACKEND", None, "redis")
+        )
+        configurations.append(ConfigProp("cache_path", "cache.path", "CACHE_PATH"))
+        configurations.append(
+            ConfigProp(
+                "cache_local_max_mib",
+                "cache.local-max-mib",
+                "CACHE_LOCAL_MAX_MIB",
+                None,
+                64,
+            )
+        )
 
         # backend
         configurations.append(
@@ -95,6 +201,32 @@ class CollectorConfiguration:
                 "http://localhost:80",
             )
         )
+        configurations.append(
+            ConfigProp(
+                "sender_threads", "backend.sender-threads", "SENDER_THREADS", None, 4
+            )
+        )
+        configurations.append(
+            ConfigProp(
+                "send_queue_size",
+                "backend.send-queue-size",
+                "SEND_QUEUE_SIZE",
+                None,
+                16,
+            )
+        )
+        configurations.append(
+            ConfigProp("send_retries", "backend.send-retries", "SEND_RETRIES", None, 5)
+        )
+        configurations.append(
+            ConfigProp(
+                "send_timeout_s", "backend.send-timeout-s", "SEND_TIMEOUT_S", None, 120
+            )
+        )
+        # defaults to outbox.sqlite next to the api object log
+        configurations.append(
+            ConfigProp("outbox_path", "backend.outbox", "OUTBOX_PATH")
+        )
         # special case: no default but required argument
         configurations.append(
             ConfigProp(
@@ -156,7 +288,13 @@ class CollectorConfiguration:
             )
         )
         self.config_file = None
+        self._api_client = None
+        self._sender_executor = None
+        self._outbox = None
+        # the pool documents are extracted on, created for each cycle in collector.__main__
+        self.extraction_executor = None
         self.dump_config = False
+        self.cache_report = False
         self.configurations = configurations
 
     def load_only_env(self):
@@ -166,9 +304,9 @@ class CollectorConfiguration:
                 continue
             env_prop = os.getenv(config.env)
             if env_prop:
-                if type(config.value) == type(int):
+                if isinstance(config.value, int) and not isinstance(config.value, bool):
                     config.value = int(env_prop)
-                elif type(config.value) == type(list):
+                elif isinstance(config.value, list):
                     config.value = env_prop.split(";")
                 else:
                     config.value = env_prop
@@ -177,12 +315,7 @@ class CollectorConfiguration:
             if config.required and config.value is None:
                 missing_required.append(config)
             setattr(self, config.attr, config.value)
-        self.oapiconfig = Configuration(host=self.database_url)
-        self.oapiconfig.api_key["apiKey"] = self.api_key
-
-        self.cache = ScraperCache(self.redis_host, self.redis_port)
-
-        self.llm_connector = LLMConnector.from_openai(self.openai_api_key)
+        self.init_secondary_objects()
 
     def load(self):
         parser = ArgumentParser(prog="collector", description="Bundled Scrapers")
@@ -192,11 +325,17 @@ class CollectorConfiguration:
             help="Await all extraction tasks one-by-one instead of gathering",
             action="store_true",
         ),
+        parser.add_argument(
+            "--cache-report",
+            help="Log how many keys and bytes each cache prefix takes up, then exit",
+            action="store_true",
+        )
 
         for config in self.configurations:
             if config.arg:
                 config.cli_setup(parser)
         args = parser.parse_args()
+        self.cache_report = args.cache_report
 
         # config file
         config_file = None
@@ -219,7 +358,8 @@ class CollectorConfiguration:
                         ):
                             continue
                         cfg_prop = loaded[cfg_path[0]][cfg_path[1]]
-                        if cfg_prop:
+                        # 0 and false are settings too
+                        if cfg_prop is not None:
                             config.value = cfg_prop
                             config.value_set_by = "cfg"
         # environment configuration
@@ -228,9 +368,9 @@ class CollectorConfiguration:
                 continue
             env_prop = os.getenv(config.env)
             if env_prop:
-                if type(config.value) == type(int):
+                if isinstance(config.value, int) and not isinstance(config.value, bool):
                     config.value = int(env_prop)
-                elif type(config.value) == type(list):
+                elif isinstance(config.value, list):
                     config.value = env_prop.split(";")
                 else:
                     config.value = env_prop
@@ -241,7 +381,7 @@ class CollectorConfiguration:
                 continue
             arg_prop = getattr(args, config.arg, None)
             if arg_prop:
-                if type(config.value) == type(int):
+                if isinstance(config.value, int) and not isinstance(config.value, bool):
                     config.value = int(arg_prop)
                 else:
                     config.value = arg_prop
@@ -265,13 +405,74 @@ class CollectorConfiguration:
                 sys.exit(1)
 
         ### now go and initialize the secondary objects
+        self.init_secondary_objects()
+
+    # the heavy dependencies behind these are imported here instead of at the top
+    def init_secondary_objects(self):
+        from openapi_client import Configuration
+        from collector.llm_connector import LLMConnector
+        from collector.scrapercache import ScraperCache
+
         self.oapiconfig = Configuration(host=self.database_url)
         self.oapiconfig.api_key["apiKey"] = self.api_key
 
-        self.cache = ScraperCache(self.redis_host, self.redis_port)
+        self.cache = ScraperCache(
+            self.redis_host,
+            self.redis_port,
+            self.cache_default_ttl_min,
+            ttl_min=self.cache_ttl_min,
+            compression=self.cache_compression,
+            local_max_mib=self.cache_local_max_mib,
+            backend=self.cache_backend_instance(),
+        )
 
         self.llm_connector = LLMConnector.from_openai(self.openai_api_key)
 
+    # None for Redis, which ScraperCache sets up from redis-host/-port itself
+    def cache_backend_instance(self):
+        kind = (self.cache_backend or "redis").lower()
+        if kind == "redis":
+            return None
+        if kind == "sqlite":
+            from collector.cache_backend import SqliteBackend
+
+            path = self.cache_path
+            if not path:
+                path = Path(self.api_obj_log or "locallogs") / "cache.sqlite"
+            return SqliteBackend(path)
+        logger.critical(
+            f"Unknown cache backend `{self.cache_backend}`: redis or sqlite"
+        )
+        sys.exit(1)
+
+    # the backend client is created once and shared by all scrapers and cycles,
+    # so its connection pool is reused instead of rebuilt for every item
+    def api_client(self) -> "ApiClient":
+        from openapi_client import ApiClient
+
+        if self._api_client is None:
+            self.oapiconfig.connection_pool_maxsize = int(self.sender_threads)
+            self._api_client = ApiClient(self.oapiconfig)
+        return self._api_client
+
+    # the generated backend client is blocking, so every call to it runs on this
+    # executor instead of the event loop
+    def sender_executor(self) -> ThreadPoolExecutor:
+        if self._sender_executor is None:
+            self._sender_executor = ThreadPoolExecutor(
+                max_workers=int(self.sender_threads), thread_name_prefix="sender"
+            )
+        return self._sender_executor
+
+    # items that could not be sent are kept here until a later cycle sends them
+    def outbox(self) -> Outbox:
+        if self._outbox is None:
+            path = self.outbox_path
+            if not path:
+                path = Path(self.api_obj_log or "locallogs") / "outbox.sqlite"
+            self._outbox = Outbox(path)
+        return self._outbox
+
     def __str__(self):
         output = "Configuration of Collector\n"
         output += f"Config File: {self.config_file}\n"
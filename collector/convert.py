@@ -3,6 +3,7 @@ from pydantic import SecretStr
 
 import datetime
 import decimal
+import logging
 import sys
 from uuid import UUID
 from openapi_client.models import *
@@ -74,6 +75,20 @@ def sanitize_for_serialization(obj):
     return {key: sanitize_for_serialization(val) for key, val in obj_dict.items()}
 
 
+# the inverse of sanitize_for_serialization for data we serialized ourselves, e.g.
+# from the cache. The generated from_dict rebuilds every nested model in python
+# before validating the whole thing again, a single model_validate does the same
+# in one pass through pydantic-core. from_dict remains the fallback
+def hydrate_model(cls, data: dict):
+    try:
+        return cls.model_validate(data)
+    except Exception as e:
+        logging.getLogger("collector").debug(
+            f"Hydrating {cls.__name__} through from_dict: {e}"
+        )
+        return cls.from_dict(data)
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Error: Specify <infile> <outfile>")
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import Optional
+import asyncio
+import copy
 import os
 import logging
 import hashlib
@@ -25,9 +28,10 @@ class DocumentBuilder(ABC):
     def to_dict(self) -> dict:
         assert False, "Abstract Method Called"
 
+    # config and session are those of the caller, for instances coming from the cache
     @classmethod
     @abstractmethod
-    def from_dict(cls, dic):
+    def from_dict(cls, dic, config=None, session=None):
         assert False, "Abstract Method Called"
 
     async def download(self) -> Path:
@@ -72,11 +76,15 @@ class DocumentBuilder(ABC):
 
     ## downloads, extracts and packages things into .output (=models.Dokument)
     ## or fetches it from cache if applicable
-    async def build(self):
+    ## prefetched: the cache was already asked for this url (see build_documents),
+    ## cached is its answer
+    async def build(self, prefetched: bool = False, cached=None):
         logger.debug(f"Building document from url: {self.url}")
-        cached = self.config.cache.get_dokument(self.url)
+        if not prefetched:
+            cached = (
+                await self.config.cache.get_dokument_objects([self.url], [self.hydrate])
+            )[0]
         if cached:
-            cached = self.from_json(cached)
             if cached.output.typ == self.typehint:
                 logger.debug(
                     f"Document with URL {self.url} was found in cache, serving..."
@@ -99,7 +107,7 @@ class DocumentBuilder(ABC):
             self.output = None
             return self
         logger.info(f"Storing {self.url} in cache")
-        self.config.cache.store_dokument(self.url, self)
+        await self.config.cache.store_dokument(self.url, self)
         return self
 
     def __del__(self):
@@ -125,9 +133,74 @@ class DocumentBuilder(ABC):
                 f"Failed to remove temporary PDF file. Exception ignored: {e}"
             )
 
+    # a copy that can be changed without touching self, for the in-process cache tier.
+    # The output is copied deeply, configuration and session are shared
+    def copy(self):
+        dup = copy.copy(self)
+        if self.output is not None:
+            dup.output = self.output.model_copy(deep=True)
+        dup.tops = copy.deepcopy(getattr(self, "tops", None))
+        return dup
+
     def to_json(self) -> dict:
         return json.dumps(self.to_dict(), default=str)
 
     @classmethod
-    def from_json(cls, jstr: str):
-        return cls.from_dict(json.loads(jstr))
+    def from_json(cls, jstr: str, config=None, session=None):
+        return cls.from_dict(json.loads(jstr), config, session)
+
+    # turns the cached json of this builder's url back into a builder like this one
+    def hydrate(self, jstr: str):
+        return self.from_json(jstr, self.config, self.session)
+
+
+# builds all given documents concurrently with at most `limit` builds in flight.
+# The output is in input order. The first failing build cancels the pending ones and
+# its exception is raised, the documents are of no use without it. Only the builders
+# in `optional` may fail on their own, their builds are returned as their exception.
+# Builders sharing a url are built one after the other in input order, so the later
+# ones are served from the cache just like they would be when building sequentially
+async def build_documents(
+    builders: list[DocumentBuilder], limit: int, optional: list = ()
+) -> list:
+    semaphore = asyncio.Semaphore(max(1, limit))
+    previous = {}
+    optional = {id(builder) for builder in optional}
+    if not builders:
+        return []
+
+    # one cache round-trip for all documents instead of one per build.
+    # only the first builder of an url can use it, later ones look again
+    # after their predecessor stored its result
+    urls = list(dict.fromkeys(builder.url for builder in builders))
+    hydrate = {}
+    for builder in builders:
+        hydrate.setdefault(builder.url, builder.hydrate)
+    prefetched = await builders[0].config.cache.get_dokument_objects(
+        urls, [hydrate[url] for url in urls]
+    )
+    prefetched = dict(zip(urls, prefetched))
+
+    async def build_one(builder, before):
+        if before is not None:
+            await asyncio.gather(before, return_exceptions=True)
+        try:
+            async with semaphore:
+                if before is None:
+                    return await builder.build(True, prefetched[builder.url])
+                return await builder.build()
+        except Exception as e:
+            if id(builder) in optional:
+                return e
+            raise
+
+    tasks = []
+    try:
+        async with asyncio.TaskGroup() as group:
+            for builder in builders:
+                task = group.create_task(build_one(builder, previous.get(builder.url)))
+                previous[builder.url] = task
+                tasks.append(task)
+    except ExceptionGroup as failed:
+        raise failed.exceptions[0]
+    return [task.result() for task in tasks]
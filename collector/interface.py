@@ -1,7 +1,9 @@
 import datetime
+from contextlib import asynccontextmanager
 from hashlib import sha256
 import json
 import logging
+import random
 from abc import ABC, abstractmethod
 from datetime import timedelta
 import sys
@@ -19,9 +21,27 @@ from openapi_client import models
 import openapi_client.api
 import openapi_client.api.collector_schnittstellen_api
 import openapi_client.api_client
+import urllib3
 
 logger = logging.getLogger("collector")
 
+# marks the end of the item stream for the consumers in Scraper.process_pipeline
+# and the background senders
+_END_OF_ITEMS = object()
+
+# backoff between two send attempts is drawn from [0, min(MAX, BASE * 2^attempt)]
+SEND_BACKOFF_BASE_S = 1.0
+SEND_BACKOFF_MAX_S = 60.0
+# responses that reject an item for good. Other 4xx are more likely a misconfigured
+# url, proxy or permission than a problem of the item, so it is kept for later
+REJECTING_STATUSES = (400, 409, 422)
+
+
+# raised by submit_with_retry (and so by send_result) when the backend rejects an
+# item for good, e.g. with a 422. Sending it again would not change that
+class ItemRejected(Exception):
+    pass
+
 
 class Scraper(ABC):
     listing_urls: List[str] = []
@@ -49,11 +69,31 @@ class Scraper(ABC):
         self.session_headers = {}
         self.item_count = 0
         self.items_done = 0
+        self.submissions = None
         global logger
         logger.info(
             f"Initialized {self.__class__.__name__} with {len(self.listing_urls)} listing urls"
         )
 
+    # runs a blocking call against the backend api on the sender executor so the event
+    # loop keeps running in the meantime, e.g.
+    # `lambda api, timeout: api.vorgang_put(..., _request_timeout=timeout)`.
+    # timeout is send-timeout-s, so a hung backend can't block the senders for good.
+    # The api client behind it is the long-lived, pooled one of the configuration
+    async def call_backend(self, call):
+        api_instance = (
+            openapi_client.api.collector_schnittstellen_api.CollectorSchnittstellenApi(
+                self.config.api_client()
+            )
+        )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.config.sender_executor(),
+            call,
+            api_instance,
+            float(self.config.send_timeout_s),
+        )
+
     # Process Listing Page URLs
     # This takes in a list of listing page urls and outputs
     # a deduplicated, cleaned set of extracted items
@@ -94,60 +134,421 @@ class Scraper(ABC):
     # This is a helper to gather-await extracting and sending in one go instead of
     # first gathering then sending in bulk. Returns a None if the extraction failed or
     # returned no result, and a tuple containing ({input item}, {extracted and sent item}) and the extracted item
-    # for comparison
+    # for comparison.
+    # Inside of background_sender() the extracted item is only handed to the senders
+    # and a future of said tuple is returned instead, see collect_submissions
     async def helper_extract_send_item(self, item):
         """Process an item by extracting and sending it to the API"""
         logger.info(f"Extraction started on item {item}")
         extracted_item = await self.item_extractor(item)
         logger.info(f"Extracted finished on item {item}")
-        if extracted_item:
-            ## because: If sent_item is None something went wrong
+        if not extracted_item:
+            return None
+        if self.submissions is not None:
+            future = asyncio.get_running_loop().create_future()
+            await self.submissions.put((item, extracted_item, future))
+            return future
+        return await self.send_and_store(item, extracted_item)
+
+    # sends the extracted item and caches it once the backend acknowledged it.
+    # Items that could not be sent are not cached but put into the outbox instead,
+    # so the next cycle sends them again without extracting them anew
+    async def send_and_store(self, item, extracted_item):
+        key = await self.make_cache_key(item)
+        ## because: If sent_item is None something went wrong
+        try:
             sent_item = await self.send_result(extracted_item)
+        except ItemRejected as e:
+            await self.reject_result(key, extracted_item, e)
+            return (None, item)
+        if sent_item:
             ## cache the shit out of the items
-            key = await self.make_cache_key(item)
             await self.store_extracted_result(key, extracted_item)
-            return (sent_item, item)
         else:
-            return None
+            await self.defer_result(key, extracted_item)
+        return (sent_item, item)
+
+    # puts an extracted but unsent item into the outbox, if the scraper can serialize it
+    async def defer_result(self, item_key: str, result: Any):
+        payload = self.serialize_result(result, item_key)
+        if payload is None:
+            return
+        await self.config.outbox().put(self.__class__.__name__, item_key, payload)
+
+    # items the backend rejected for good are neither deferred nor extracted again:
+    # they are cached like sent ones (and were logged by submit_with_retry), so the
+    # next cycles don't pay for extracting them only to be rejected again
+    async def reject_result(self, item_key: str, result: Any, reason: Exception):
+        logger.error(
+            f"{self.__class__.__name__}: Backend rejected `{item_key}` ({reason}), caching it anyway"
+        )
+        await self.store_extracted_result(item_key, result)
+
+    # wether the item behind item_key waits in the outbox, i.e. must not be extracted again
+    async def is_deferred(self, item_key: str) -> bool:
+        return await self.config.outbox().contains(self.__class__.__name__, item_key)
+
+    # Drain Outbox
+    # Sends the items earlier cycles could not send (see send_and_store) before
+    # anything new is extracted. Entries leave the outbox only once the backend
+    # acknowledged or rejected them: extracting them again would cost just as much.
+    # The output has the same format as process_items, with the cache key as input item
+    async def drain_outbox(self) -> List[Any]:
+        global logger
+        name = self.__class__.__name__
+        outbox = self.config.outbox()
+        entries = await outbox.entries(name)
+        if len(entries) == 0:
+            return []
+        logger.info(f"{name}: Sending {len(entries)} items left in the outbox")
+
+        async def drain_entry(entry):
+            key, payload, attempts = entry
+            try:
+                result = self.deserialize_result(payload, key)
+            except Exception:
+                logger.error(f"{name}: Dropping unreadable outbox entry `{key}`")
+                await outbox.remove(name, key)
+                raise
+            try:
+                sent_item = await self.send_result(result)
+            except ItemRejected as e:
+                await self.reject_result(key, result, e)
+                await outbox.remove(name, key)
+                return (None, key)
+            if sent_item:
+                await self.store_extracted_result(key, result)
+                await outbox.remove(name, key)
+            else:
+                logger.warning(
+                    f"{name}: `{key}` is still unsent after {attempts} cycles, keeping it in the outbox"
+                )
+                await outbox.record_attempt(name, key)
+            return (sent_item, key)
+
+        return await self.schedule_items(entries, drain_entry)
+
+    # Runs background senders for as long as the context is active. Extraction hands
+    # its results to them through a bounded queue instead of waiting for the backend,
+    # leaving the context waits for all handed over results to be sent.
+    # With --linearize, items are sent inline instead
+    @asynccontextmanager
+    async def background_sender(self):
+        if self.config.linearize:
+            yield
+            return
+        senders = max(1, int(self.config.sender_threads))
+        self.submissions = asyncio.Queue(maxsize=int(self.config.send_queue_size))
+
+        async def send_worker():
+            while True:
+                entry = await self.submissions.get()
+                if entry is _END_OF_ITEMS:
+                    return
+                item, extracted_item, future = entry
+                try:
+                    future.set_result(await self.send_and_store(item, extracted_item))
+                except Exception as e:
+                    future.set_exception(e)
+
+        workers = [asyncio.create_task(send_worker()) for _ in range(senders)]
+        try:
+            yield
+        finally:
+            for _ in workers:
+                await self.submissions.put(_END_OF_ITEMS)
+            await asyncio.gather(*workers)
+            self.submissions = None
+
+    # replaces the futures handed out inside of background_sender() by their results
+    async def collect_submissions(self, results: List[Any]) -> List[Any]:
+        collected = []
+        for result in results:
+            if isinstance(result, asyncio.Future):
+                try:
+                    result = await result
+                except Exception as e:
+                    result = e
+            collected.append(result)
+        return collected
+
+    # sends an item by running `call` (see call_backend). 5xx, 408 and 429 responses,
+    # timeouts and connection errors are retried with exponential backoff and jitter.
+    # Returns the item on success and None on a recoverable error, as
+    # send_result must. REJECTING_STATUSES raise ItemRejected, other 4xx are not
+    # retried but recoverable. Exits if the backend rejects the api key
+    async def submit_with_retry(self, item: Any, call) -> Optional[Any]:
+        global SEND_BACKOFF_BASE_S, SEND_BACKOFF_MAX_S, REJECTING_STATUSES
+        retries = int(self.config.send_retries)
+        attempt = 0
+        while True:
+            try:
+                ret = await self.call_backend(call)
+                logger.info(f"Object sent successfully, API Response: {ret}")
+                return item
+            except openapi_client.ApiException as e:
+                logger.error(f"API Exception: {e}")
+                if e.status == 422:
+                    logger.error(sanitize_for_serialization(item))
+                    logger.error(
+                        "Unprocessable Entity, tried to send item(see above)\n"
+                    )
+                    self.log_item(item, True)
+                    raise ItemRejected("422 Unprocessable Entity") from e
+                elif e.status == 401:
+                    logger.critical("Authentication failed. Check your API key.")
+                    sys.exit(1)
+                elif e.status in REJECTING_STATUSES:
+                    self.log_item(item, True)
+                    raise ItemRejected(f"HTTP {e.status}") from e
+                elif e.status is None:
+                    return None
+                elif e.status < 500 and e.status not in (408, 429):
+                    logger.error(
+                        f"Backend answered {e.status}, keeping the item to send it later"
+                    )
+                    return None
+            except (TimeoutError, ConnectionError, urllib3.exceptions.HTTPError) as e:
+                logger.error(f"Backend unreachable: {e}")
+            except Exception as e:
+                logger.error(f"Unexpected error sending item to API: {e}")
+                return None
+            if attempt >= retries:
+                logger.error(f"Giving up sending item after {attempt + 1} attempts")
+                return None
+            delay = random.uniform(
+                0, min(SEND_BACKOFF_MAX_S, SEND_BACKOFF_BASE_S * 2**attempt)
+            )
+            attempt += 1
+            logger.warning(
+                f"Retrying to send item in {delay:.1f}s (Try {attempt}/{retries})"
+            )
+            await asyncio.sleep(delay)
+
+    # the maximum number of items a single scraper keeps in flight at once.
+    # --linearize forces this down to one
+    def max_items_in_flight(self) -> int:
+        if self.config.linearize:
+            return 1
+        return max(1, int(self.config.max_items_in_flight or 1))
+
+    # the maximum number of documents built concurrently for a single item.
+    # --linearize forces this down to one
+    def max_documents_in_flight(self) -> int:
+        if self.config.linearize:
+            return 1
+        return max(1, int(self.config.max_documents_in_flight or 1))
+
+    # Conditional Page Fetch
+    # GETs url, asking the server with the validators of the cached copy (ETag,
+    # Last-Modified) wether the page changed. On a 304 the cached body is used.
+    # Returns (body, cache entry, unchanged), the entry being None for anything but
+    # a 200 or 304. unchanged is true if the body is the cached one - also when a
+    # server without validators sent the same page again, noticed by its sha256.
+    # Nothing is cached here, see store_page
+    async def conditional_get(self, url: str) -> Tuple[str, Optional[dict], bool]:
+        entry = await self.config.cache.get_html_entry(url)
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                logger.debug(f"Page not modified: `{url}`")
+                return entry["body"], entry, True
+            body = await response.text()
+            if response.status != 200:
+                return body, None, False
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        unchanged = (
+            entry is not None
+            and entry.get("sha256") == sha256(body.encode("utf-8")).hexdigest()
+        )
+        parsed = entry.get("parsed") if unchanged else None
+        entry = {"etag": etag, "last_modified": last_modified, "parsed": parsed}
+        return body, entry, unchanged
+
+    # caches a page fetched by conditional_get along with what it parsed to. This
+    # happens on every fetch, also of unchanged pages, so their entries don't expire
+    # while the pages are still in use
+    async def store_page(self, url: str, body: str, entry: dict, parsed: Any = None):
+        await self.config.cache.store_html(
+            url,
+            body,
+            etag=entry.get("etag"),
+            last_modified=entry.get("last_modified"),
+            parsed=parsed,
+        )
+
+    # the body of url, see conditional_get
+    async def fetch_text(self, url: str) -> str:
+        body, entry, _ = await self.conditional_get(url)
+        if entry is not None:
+            await self.store_page(url, body, entry, entry.get("parsed"))
+        return body
+
+    # the result of `await parse(body)` for the page at url. The result is cached
+    # along with the page and reused as long as the page does not change, so it
+    # must be json-able
+    async def fetch_parsed(self, url: str, parse) -> Any:
+        body, entry, unchanged = await self.conditional_get(url)
+        if unchanged and entry.get("parsed") is not None:
+            parsed = entry["parsed"]
+        else:
+            parsed = await parse(body)
+        # pages that could not be fetched are not cached, neither is what they parse to
+        if entry is not None:
+            await self.store_page(url, body, entry, parsed)
+        return parsed
+
+    # Bounded Item Scheduler
+    # Runs `worker` on every item with at most `max_items_in_flight()` items in flight.
+    # Items are handed out in the given order from a single FIFO work queue, so a
+    # slow item only ever blocks its own worker slot.
+    # The output is in input order, one entry per item, with exceptions returned
+    # in place (like asyncio.gather(..., return_exceptions=True))
+    async def schedule_items(self, items: List[Any], worker) -> List[Any]:
+        queue = asyncio.Queue()
+        for index, item in enumerate(items):
+            queue.put_nowait((index, item))
+        results = [None] * len(items)
+
+        async def run_worker():
+            while True:
+                try:
+                    index, item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    results[index] = await worker(item)
+                except Exception as e:
+                    results[index] = e
+
+        workers = min(self.max_items_in_flight(), len(items))
+        logger.debug(
+            f"{self.__class__.__name__}: Scheduling {len(items)} items on {workers} workers"
+        )
+        await asyncio.gather(*[run_worker() for _ in range(workers)])
+        return results
 
     # Process Items
     # Takes in a set of items, outputs an extracted + sent set of results
     async def process_items(self, items: Set[Any]) -> List[Any]:
-        tasks = []
+        pending = []
         processed_count = 0
         skipped_count = 0
         logger.info("Processing Items Now")
 
-        for item in sorted(items):
+        items = sorted(items)
+        keys = [await self.make_cache_key(item) for item in items]
+        cached_keys = await self.get_current_keys(items, keys)
+        for item, key in zip(items, keys):
             # Check if item is already in cache
-            key = await self.make_cache_key(item)
-            cached = await self.get_cached_result(key)
-            if cached is not None:
+            if key in cached_keys:
                 logger.debug(f"{key} found in cache, skipping...")
                 skipped_count += 1
                 continue
+            if await self.is_deferred(key):
+                logger.debug(f"{key} waits in the outbox, skipping...")
+                skipped_count += 1
+                continue
 
-            tasks.append(self.helper_extract_send_item(item))
+            pending.append(item)
             processed_count += 1
-        self.item_count = len(tasks)
+        self.item_count = len(pending)
         logger.info(
             f"{self.__class__.__name__}: Processing {processed_count} items, skipping {skipped_count} cached items"
         )
         temp_res = []
         try:
-            # temp_res = await asyncio.gather(*tasks, return_exceptions=True)
-            if self.config.linearize:
-                for t in tasks:
-                    temp_res.append(await t)
-            else:
-                temp_res = await asyncio.gather(*tasks, return_exceptions=True)
+            async with self.background_sender():
+                temp_res = await self.schedule_items(
+                    pending, self.helper_extract_send_item
+                )
         except Exception as e:
             logger.error(
                 f"{self.__class__.__name__}: Error during item extraction gathering: {e}",
                 exc_info=True,
             )
 
-        return temp_res
+        return await self.collect_submissions(temp_res)
+
+    # Streaming Pipeline
+    # Listing pages are the producers, feeding their items into a bounded queue as
+    # soon as each listing_page_extractor returns. max_items_in_flight() item workers
+    # consume that queue concurrently, so item work overlaps the remaining listing
+    # fetches. Deduplication and the cache check happen per item on the way in.
+    # The output has the same format as process_items
+    async def process_pipeline(self, lpurls: List[str]) -> List[Any]:
+        global logger
+        logger.info("Processing Listing Pages and Items as Pipeline")
+        workers = self.max_items_in_flight()
+        queue = asyncio.Queue(maxsize=2 * workers)
+        seen = set()
+        results = []
+        skipped_count = 0
+
+        # a failing listing page is logged and ends only its own producer, so
+        # the others still get to queue all of their items
+        async def produce(lpage):
+            nonlocal skipped_count
+            logger.info(f"Extracting from url `{lpage}`")
+            try:
+                items = await self.listing_page_extractor(lpage)
+                fresh = []
+                for item in items:
+                    if item not in seen:
+                        seen.add(item)
+                        fresh.append(item)
+                keys = [await self.make_cache_key(item) for item in fresh]
+                cached_keys = await self.get_current_keys(fresh, keys)
+                for item, key in zip(fresh, keys):
+                    if key in cached_keys:
+                        logger.debug(f"{key} found in cache, skipping...")
+                        skipped_count += 1
+                        continue
+                    if await self.is_deferred(key):
+                        logger.debug(f"{key} waits in the outbox, skipping...")
+                        skipped_count += 1
+                        continue
+                    self.item_count += 1
+                    await queue.put(item)
+            except Exception as e:
+                logger.error(
+                    f"{self.__class__.__name__}: Error extracting listing page {lpage}: {e}",
+                    exc_info=True,
+                )
+
+        async def consume():
+            while True:
+                item = await queue.get()
+                if item is _END_OF_ITEMS:
+                    return
+                try:
+                    results.append(await self.helper_extract_send_item(item))
+                except Exception as e:
+                    results.append(e)
+
+        async with self.background_sender():
+            consumers = [asyncio.create_task(consume()) for _ in range(workers)]
+            try:
+                await asyncio.gather(*[produce(lpage) for lpage in lpurls])
+            except Exception as e:
+                logger.error(
+                    f"{self.__class__.__name__}: Error during listing page extraction: {e}",
+                    exc_info=True,
+                )
+            finally:
+                for _ in consumers:
+                    await queue.put(_END_OF_ITEMS)
+                await asyncio.gather(*consumers)
+        logger.info(
+            f"{self.__class__.__name__}: Processed {self.item_count} items, skipped {skipped_count} cached items"
+        )
+        return await self.collect_submissions(results)
 
     # Process Results
     # Takes in a set of results (=extracted+sent items) and does some cleanup and
@@ -185,14 +586,21 @@ class Scraper(ABC):
 
     async def run(self):
         global logger
-        # Extract all listing pages
-        iset = await self.process_lpurls(self.listing_urls)
+        # first send what earlier cycles extracted but could not send
+        drained = await self.drain_outbox()
 
-        # Process + send all items them
-        rset = await self.process_items(iset)
+        if self.config.linearize:
+            # Extract all listing pages
+            iset = await self.process_lpurls(self.listing_urls)
+
+            # Process + send all items them
+            rset = await self.process_items(iset)
+        else:
+            # Extract listing pages and process + send their items as they arrive
+            rset = await self.process_pipeline(self.listing_urls)
 
         # do cleanup and logging, post-action
-        await self.process_results(rset)
+        await self.process_results(drained + rset)
 
     # abstract method to be implemented below. Taking in an item,
     # this method's job is to look up wether this item was already processed
@@ -202,6 +610,38 @@ class Scraper(ABC):
     async def get_cached_result(self, item_key: str) -> Optional[Any]:
         assert False, "Abstract Base Method Called"
 
+    # the subset of item_keys that get_cached_result would find. Scrapers should
+    # override this to ask the cache for all keys at once, the default looks them
+    # up one by one
+    async def get_cached_keys(self, item_keys: List[str]) -> Set[str]:
+        cached = await asyncio.gather(
+            *[self.get_cached_result(key) for key in item_keys]
+        )
+        return {key for key, result in zip(item_keys, cached) if result is not None}
+
+    # the subset of the cached item_keys whose items changed since they were cached
+    # and have to be extracted again. items are the listing items behind item_keys.
+    # The default trusts the cache
+    async def get_stale_keys(self, items: List[Any], item_keys: List[str]) -> Set[str]:
+        return set()
+
+    # the keys of the items that need no extraction: cached and not stale
+    async def get_current_keys(
+        self, items: List[Any], item_keys: List[str]
+    ) -> Set[str]:
+        cached_keys = await self.get_cached_keys(item_keys)
+        cached = [(i, k) for i, k in zip(items, item_keys) if k in cached_keys]
+        if len(cached) == 0:
+            return cached_keys
+        stale_keys = await self.get_stale_keys(
+            [i for i, _ in cached], [k for _, k in cached]
+        )
+        if stale_keys:
+            logger.info(
+                f"{self.__class__.__name__}: {len(stale_keys)} cached items changed, extracting them again"
+            )
+        return cached_keys - stale_keys
+
     @abstractmethod
     async def store_extracted_result(self, item_key: str, result: Any) -> Optional[Any]:
         assert False, "Abstract Base Method Called"
@@ -212,6 +652,16 @@ class Scraper(ABC):
     async def make_cache_key(self, item: Any) -> Optional[str]:
         assert False, "Abstract Base Method Called"
 
+    # turns an extracted item into a string for the outbox, see defer_result.
+    # item_key is the cache key it is deferred under.
+    # Scrapers returning None here keep unsent items out of the outbox
+    def serialize_result(self, result: Any, item_key: str) -> Optional[str]:
+        return None
+
+    # inverse of serialize_result
+    def deserialize_result(self, payload: str, item_key: str) -> Any:
+        assert False, "Scraper does not support the outbox"
+
     # function to log an item to a predetermined location on error or on debug mode (config.api_obj_log is not None)
     # @item: the item to be logged
     # @override: if set, log to default directory, regardless of wether config.api_obj_log has been set
@@ -283,38 +733,31 @@ class VorgangsScraper(Scraper):
         self.log_item(item)
 
         # Send to API
-        with openapi_client.ApiClient(self.config.oapiconfig) as api_client:
-            api_instance = openapi_client.api.collector_schnittstellen_api.CollectorSchnittstellenApi(
-                api_client
-            )
-            try:
-                _ret = api_instance.vorgang_put(str(self.scraper_id), item)
-                logger.info("Object sent successfully")
-                return item
-            except openapi_client.ApiException as e:
-                logger.error(f"API Exception: {e}")
-                if e.status == 422:
-                    logger.error(sanitize_for_serialization(item))
-                    logger.error(
-                        "Unprocessable Entity, tried to send item(see above)\n"
-                    )
-                    self.log_item(item, True)
-                elif e.status == 401:
-                    logger.critical("Authentication failed. Check your API key.")
-                    sys.exit(1)
-                return None
-            except Exception as e:
-                logger.error(f"Unexpected error sending item to API: {e}")
-                return None
+        return await self.submit_with_retry(
+            item,
+            lambda api, timeout: api.vorgang_put(
+                str(self.scraper_id), item, _request_timeout=timeout
+            ),
+        )
 
     async def make_cache_key(self, item):
         return str(item)  # item is just a url in this case. easy!
 
     async def get_cached_result(self, item_key):
-        return self.config.cache.get_vorgang(item_key)
+        return await self.config.cache.get_vorgang(item_key)
 
     async def store_extracted_result(self, item_key, result):
-        self.config.cache.store_vorgang(item_key, result)
+        await self.config.cache.store_vorgang(item_key, result)
+
+    async def get_cached_keys(self, item_keys):
+        cached = await self.config.cache.has_vorgaenge(item_keys)
+        return {key for key, exists in zip(item_keys, cached) if exists}
+
+    def serialize_result(self, result: models.Vorgang, item_key: str) -> str:
+        return json.dumps(sanitize_for_serialization(result))
+
+    def deserialize_result(self, payload: str, item_key: str) -> models.Vorgang:
+        return models.Vorgang.from_json(payload)
 
 
 class SitzungsScraper(Scraper):
@@ -337,7 +780,26 @@ class SitzungsScraper(Scraper):
                 logger.error(f"Failed to write to API object log: {e}")
 
     async def store_extracted_result(self, item_key, result):
-        self.config.cache.store_raw(item_key, str(result))
+        await self.config.cache.store_raw(item_key, str(result))
+
+    def serialize_result(
+        self, result: Tuple[datetime.date, List[models.Sitzung]], item_key: str
+    ) -> str:
+        return json.dumps(
+            {
+                "datum": result[0].isoformat(),
+                "sitzungen": sanitize_for_serialization(result[1]),
+            }
+        )
+
+    def deserialize_result(
+        self, payload: str, item_key: str
+    ) -> Tuple[datetime.date, List[models.Sitzung]]:
+        obj = json.loads(payload)
+        return (
+            datetime.date.fromisoformat(obj["datum"]),
+            [models.Sitzung.from_dict(sitzung) for sitzung in obj["sitzungen"]],
+        )
 
     async def send_result(
         self, item: Tuple[datetime.datetime, List[models.Sitzung]]
@@ -350,37 +812,27 @@ class SitzungsScraper(Scraper):
         self.log_item(item)
 
         # Send to API
-        with openapi_client.ApiClient(self.config.oapiconfig) as api_client:
-            api_instance = openapi_client.api.collector_schnittstellen_api.CollectorSchnittstellenApi(
-                api_client
-            )
-            try:
-                ret = api_instance.kal_date_put(
-                    x_scraper_id=str(self.scraper_id),
-                    parlament=models.Parlament.BY,
-                    datum=item[0],
-                    sitzung=item[1],
-                )
-                logger.info(f"API Response: {ret}")
-                return item
-            except openapi_client.ApiException as e:
-                logger.error(f"API Exception: {e}")
-                if e.status == 422:
-                    logger.error(sanitize_for_serialization(item))
-                    logger.error(
-                        "Unprocessable Entity, tried to send item(see above)\n"
-                    )
-                    self.log_item(item, True)
-                elif e.status == 401:
-                    logger.critical("Authentication failed. Check your API key.")
-                    sys.exit(1)
-                return None
-            except Exception as e:
-                logger.error(f"Unexpected error sending item to API: {e}")
-                return None
+        return await self.submit_with_retry(
+            item,
+            lambda api, timeout: api.kal_date_put(
+                x_scraper_id=str(self.scraper_id),
+                parlament=models.Parlament.BY,
+                datum=item[0],
+                sitzung=item[1],
+                _request_timeout=timeout,
+            ),
+        )
 
     async def get_cached_result(self, item_key):
-        return self.config.cache.get_raw(item_key)
+        return await self.config.cache.get_raw(item_key)
+
+    async def get_cached_keys(self, item_keys):
+        cached = await self.config.cache.exists_many(item_keys, "Sitzung")
+        return {key for key, exists in zip(item_keys, cached) if exists}
 
+    # the day and the html of its sessions, so the key is the same across calls
+    # and restarts as long as the day's listing does not change
     async def make_cache_key(self, item):
-        return f"sz:{str(sha256(str(item).encode()))}"
+        termin, sitzungen = item
+        content = "\n".join([str(termin), *sorted(str(s) for s in sitzungen)])
+        return f"sz:{sha256(content.encode()).hexdigest()}"
@@ -1,12 +1,11 @@
-from litellm import acompletion
-import litellm
 import logging
 import time
 import asyncio
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 import json
-import jsonschema
-from collector.scrapercache import ScraperCache
+
+if TYPE_CHECKING:
+    from collector.scrapercache import ScraperCache
 
 logger = logging.getLogger("collector")
 MIN_TEXT_LEN = 20
@@ -40,7 +39,12 @@ async def guard_llm_rate():
                 return
 
 
-litellm.suppress_debug_info = True
+# litellm takes seconds to import, so it is only loaded for the first request
+def load_litellm():
+    import litellm
+
+    litellm.suppress_debug_info = True
+    return litellm
 
 
 class LLMConnector:
@@ -61,7 +65,7 @@ class LLMConnector:
     async def generate(self, prompt: str, text: str) -> str:
         try:
             await guard_llm_rate()
-            response = await acompletion(
+            response = await load_litellm().acompletion(
                 model=self.model_name,
                 messages=[
                     {
@@ -81,14 +85,16 @@ class LLMConnector:
             raise e
 
     async def extract_info(
-        self, prompt: str, text: str, schema: dict, key: str, cache: ScraperCache
+        self, prompt: str, text: str, schema: dict, key: str, cache: "ScraperCache"
     ) -> dict:
         global MIN_TEXT_LEN, MAX_TRIES
+        import jsonschema
+
         effective_key = f"llm-response:{key}"
-        cached = cache.get_raw(effective_key, "LLM Response")
-        if cached:
+        cached = await cache.get_hydrated(effective_key, json.loads, "LLM Response")
+        if cached is not None:
             logger.info(f"Used cached llm response for {key}")
-            return json.loads(cached)
+            return cached
 
         text = text.strip()
         if len(text) < MIN_TEXT_LEN:
@@ -100,7 +106,7 @@ class LLMConnector:
             try:
                 obj = json.loads(response)
                 jsonschema.validate(obj, schema)
-                cache.store_raw(effective_key, response, "LLM Response")
+                await cache.store_raw(effective_key, response, "LLM Response")
                 return obj
             except Exception as e:
                 logger.warning(f"Error Occurred: {e}")
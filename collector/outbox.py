@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import sqlite3
+
+logger = logging.getLogger("collector")
+
+
+class Outbox:
+    """
+    Durable store for extracted items that could not be sent to the backend (yet).
+    Entries are kept per scraper in a SQLite file and survive restarts, so a backend
+    outage does not cost the extraction (downloads, OCR, LLM calls) a second time.
+    The file is only created once the first item is put into it. Like the
+    SqliteBackend, all statements run one after the other on a thread of their own,
+    so the event loop never waits for the disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.connection = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+
+    async def run(self, f, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, f, *args)
+
+    def connect(self, create: bool = False) -> Optional[sqlite3.Connection]:
+        global logger
+        if self.connection is None:
+            if not create and not self.path.exists():
+                return None
+            if not self.path.parent.exists():
+                logger.info(f"Creating Filepath: {self.path.parent}")
+                self.path.parent.mkdir(parents=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS outbox (
+                    scraper TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (scraper, key)
+                )""")
+            self.connection.commit()
+        return self.connection
+
+    def _put(self, scraper: str, key: str, payload: str):
+        logger.info(f"Storing unsent item `{key}` in outbox {self.path}")
+        connection = self.connect(create=True)
+        connection.execute(
+            """INSERT INTO outbox (scraper, key, payload) VALUES (?, ?, ?)
+            ON CONFLICT (scraper, key) DO UPDATE SET payload = excluded.payload""",
+            (scraper, key, payload),
+        )
+        connection.commit()
+
+    def _record_attempt(self, scraper: str, key: str):
+        connection = self.connect()
+        if connection is None:
+            return
+        connection.execute(
+            "UPDATE outbox SET attempts = attempts + 1 WHERE scraper = ? AND key = ?",
+            (scraper, key),
+        )
+        connection.commit()
+
+    def _remove(self, scraper: str, key: str):
+        connection = self.connect()
+        if connection is None:
+            return
+        connection.execute(
+            "DELETE FROM outbox WHERE scraper = ? AND key = ?", (scraper, key)
+        )
+        connection.commit()
+
+    def _contains(self, scraper: str, key: str) -> bool:
+        connection = self.connect()
+        if connection is None:
+            return False
+        row = connection.execute(
+            "SELECT 1 FROM outbox WHERE scraper = ? AND key = ?", (scraper, key)
+        ).fetchone()
+        return row is not None
+
+    def _entries(self, scraper: str) -> List[Tuple[str, str, int]]:
+        connection = self.connect()
+        if connection is None:
+            return []
+        return connection.execute(
+            "SELECT key, payload, attempts FROM outbox WHERE scraper = ? ORDER BY rowid",
+            (scraper,),
+        ).fetchall()
+
+    async def put(self, scraper: str, key: str, payload: str):
+        await self.run(self._put, scraper, key, payload)
+
+    async def record_attempt(self, scraper: str, key: str):
+        await self.run(self._record_attempt, scraper, key)
+
+    async def remove(self, scraper: str, key: str):
+        await self.run(self._remove, scraper, key)
+
+    async def contains(self, scraper: str, key: str) -> bool:
+        return await self.run(self._contains, scraper, key)
+
+    # returns the (key, payload, attempts) of all entries of a scraper, oldest first
+    async def entries(self, scraper: str) -> List[Tuple[str, str, int]]:
+        return await self.run(self._entries, scraper)
@@ -0,0 +1,141 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+
+from collector.tesseract_wrapper import extract_ocr_pages, extract_ocr_text
+
+logger = logging.getLogger("collector")
+
+# pdfs yielding less text than this are considered scanned and are OCR'd instead
+MIN_TEXT_LEN = 64
+
+
+# Turns the pdf at `path` into (text, metadata, sha256 hexdigest, page texts), without
+# OCR. The page texts are what kreuzberg extracted of each page in the same pass, in
+# page order. They are only tracked if `track_pages`, None otherwise.
+# This runs on the extraction pool, so it has to stay a picklable top-level function
+def extract_pdf(
+    path: Path, track_pages: bool = False
+) -> Tuple[str, dict, str, Optional[List[str]]]:
+    # kreuzberg is heavy, so it is only imported where documents are extracted
+    from kreuzberg import ExtractionConfig, PageConfig, extract_file_sync
+
+    with open(path, "rb") as f:
+        # Calculate file hash for document identification
+        doc_hash = hashlib.file_digest(f, "sha256").hexdigest()
+
+    if track_pages:
+        config = ExtractionConfig(force_ocr=False, pages=PageConfig(extract_pages=True))
+    else:
+        config = ExtractionConfig(force_ocr=False)
+    result = extract_file_sync(path, config=config)
+    pages = None
+    if track_pages and result.pages:
+        pages = [
+            page["content"]
+            for page in sorted(result.pages, key=lambda page: page["page_number"])
+        ]
+    return result.content, dict(result.metadata or {}), doc_hash, pages
+
+
+# replaces the text of the given (0-based) pages in content, using the page
+# boundaries kreuzberg recorded in the metadata (byte offsets into the utf-8 content).
+# Without them the page texts are joined instead
+def splice_pages(
+    content: str, metadata: dict, pages: List[str], replaced: Dict[int, str]
+) -> str:
+    boundaries = (metadata.get("pages") or {}).get("boundaries") or []
+    if len(boundaries) != len(pages):
+        return "\n\n".join(replaced.get(i, text) for i, text in enumerate(pages))
+    data = content.encode("utf-8")
+    spliced = []
+    offset = 0
+    for i, boundary in enumerate(sorted(boundaries, key=lambda b: b["page_number"])):
+        if i not in replaced:
+            continue
+        spliced.append(data[offset : boundary["byte_start"]])
+        spliced.append(replaced[i].encode("utf-8"))
+        offset = boundary["byte_end"]
+    spliced.append(data[offset:])
+    return b"".join(spliced).decode("utf-8", errors="replace")
+
+
+# creates the pool documents are extracted on. `kind` is one of
+# "process", "interpreter" (subinterpreters, python 3.14+) or "thread"
+def create_extraction_pool(kind: str, workers: int) -> Executor:
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    if kind == "interpreter":
+        try:
+            from concurrent.futures import InterpreterPoolExecutor
+
+            logger.info(f"Extracting documents on {workers} subinterpreters")
+            return InterpreterPoolExecutor(max_workers=workers)
+        except ImportError:
+            logger.warning(
+                "Subinterpreter pools need python 3.14 or newer, using processes instead"
+            )
+            kind = "process"
+    if kind == "thread":
+        logger.info(f"Extracting documents on {workers} threads")
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extraction")
+    if kind != "process":
+        logger.warning(f"Unknown extraction pool `{kind}`, using processes instead")
+    logger.info(f"Extracting documents on {workers} processes")
+    # the collector runs threads (e.g. the backend senders), which forking does not mix with
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+# runs extract_pdf on the extraction pool of the current cycle, or on the default
+# executor of the loop if there is none (e.g. when running a single scraper).
+# Scanned pdfs are OCR'd afterwards, with tesseract running as async subprocesses,
+# unless the OCR text of a pdf with the same hash is found in the cache.
+# In pdfs with a text layer only the pages with less than ocr-min-page-chars of text
+# are OCR'd (0 turns that off), and their OCR text is spliced into the extracted
+# text. Pages OCR fails on or finds nothing on keep what was extracted of them
+async def extract_pdf_off_loop(config, path: Path) -> Tuple[str, dict, str]:
+    global MIN_TEXT_LEN
+    loop = asyncio.get_running_loop()
+    pool = config.extraction_executor
+    min_page_chars = int(config.ocr_min_page_chars or 0)
+    content, metadata, doc_hash, pages = await loop.run_in_executor(
+        pool, extract_pdf, path, min_page_chars > 0
+    )
+    no_text = content is None or len(content) <= MIN_TEXT_LEN
+    scanned = [
+        i for i, text in enumerate(pages or []) if len(text.strip()) < min_page_chars
+    ]
+    if not no_text and len(scanned) == 0:
+        return content, metadata, doc_hash
+
+    cached = await config.cache.get_ocr_text(doc_hash)
+    if cached is not None:
+        logger.info(f"Used cached OCR text of {path}")
+        return cached, metadata, doc_hash
+    if no_text:
+        logger.warning(
+            f"Normal extraction failed. Retrying with OCR. This might take a while."
+        )
+        content = await extract_ocr_text(Path(path))
+        await config.cache.store_ocr_text(doc_hash, content)
+        return content, metadata, doc_hash
+
+    logger.info(
+        f"OCR'ing {len(scanned)} of {len(pages)} pages without text layer in {path}"
+    )
+    texts = await extract_ocr_pages(Path(path), [i + 1 for i in scanned])
+    replaced = {i: text for i, text in zip(scanned, texts) if text}
+    if replaced:
+        content = splice_pages(content, metadata, pages, replaced)
+    else:
+        logger.info(f"OCR found no text in {path}, keeping its text layer")
+    # pages OCR failed on are tried again next time
+    if None not in texts:
+        await config.cache.store_ocr_text(doc_hash, content)
+    return content, metadata, doc_hash
@@ -4,21 +4,164 @@ from openapi_client import models
 from collector.convert import sanitize_for_serialization
 from collector.document_builder import *
 from pathlib import Path
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Callable, Optional, Dict, Any, List
+import asyncio
+import copy
+import hashlib
+import inspect
 import logging
 import redis
 import sys
+import zlib
+
+from collector.cache_backend import CacheBackend, RedisBackend
 
 logger = logging.getLogger("collector")
 
+# time to live in minutes per key prefix, keys without a matching prefix live for
+# default_expiration_min. 0 keeps a key forever. Sitzungen expire quickly so they
+# get re-checked. Vorgänge are re-checked through their fingerprint (vgfp:) instead
+# and are only written again when their page changed, so they must not expire.
+# Expensive llm responses and ocr'd text stay
+DEFAULT_TTL_MIN = {
+    "llm-response:": 60 * 24 * 90,
+    "ocr:": 60 * 24 * 90,
+    "dok:": 60 * 24 * 30,
+    "vg:": 0,
+    "vgfp:": 0,
+    "vgid:": 0,
+    "sz:": 60 * 24,
+    "html:": 60 * 24 * 7,
+}
+# values of these prefixes are compressed: documents carry their full text,
+# Vorgänge all of their documents and pages are html. The rest is small or short-lived
+COMPRESSED_PREFIXES = ("dok:", "vg:", "html:")
+# shorter values are not worth the effort
+COMPRESSION_MIN_BYTES = 1024
+ZSTD_LEVEL = 3
+# first byte of a compressed value. Plain values are utf-8 json or html and never
+# start with one of these control characters, so entries written before
+# compression (or with it turned off) still read
+CODEC_MARKERS = {"zlib": b"\x01", "zstd": b"\x02"}
+
+# compression.zstd (python 3.14+) or the zstandard package, whichever is there
+zstd = None
+_zstd_loaded = False
+
+
+def load_zstd():
+    global zstd, _zstd_loaded
+    if not _zstd_loaded:
+        _zstd_loaded = True
+        try:
+            from compression import zstd
+        except ImportError:
+            try:
+                import zstandard as zstd
+            except ImportError:
+                zstd = None
+    return zstd
+
+
+# the codec new values are written with: auto (zstd if available, zlib otherwise),
+# zstd, zlib or none
+def resolve_codec(compression: str) -> Optional[str]:
+    compression = (compression or "none").lower()
+    if compression == "none":
+        return None
+    if compression in ("auto", "zstd") and load_zstd() is not None:
+        return "zstd"
+    if compression == "zstd":
+        logger.warning("zstd is not available, compressing cache values with zlib")
+    elif compression not in ("auto", "zlib"):
+        logger.warning(f"Unknown cache compression `{compression}`, using zlib")
+    return "zlib"
+
+
+def encode_value(value: str, codec: Optional[str]) -> bytes:
+    data = value.encode("utf-8")
+    if codec is None or len(data) < COMPRESSION_MIN_BYTES:
+        return data
+    if codec == "zstd":
+        return CODEC_MARKERS["zstd"] + load_zstd().compress(data, ZSTD_LEVEL)
+    return CODEC_MARKERS["zlib"] + zlib.compress(data)
+
+
+# inverse of encode_value, for whatever codec the value was written with
+def decode_value(raw: Optional[bytes]) -> Optional[str]:
+    if raw is None:
+        return None
+    marker = raw[:1]
+    if marker == CODEC_MARKERS["zlib"]:
+        raw = zlib.decompress(raw[1:])
+    elif marker == CODEC_MARKERS["zstd"]:
+        if load_zstd() is None:
+            raise ValueError("Value is zstd compressed, but zstd is not available")
+        raw = zstd.decompress(raw[1:])
+    return raw.decode("utf-8")
+
+
+class LocalTier:
+    """
+    Bounded in-process LRU of hydrated cache entries in front of the backend.
+    An entry is accounted with the length of the json it was hydrated from,
+    the least recently used entries are evicted once max_bytes are exceeded.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (object, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: str, obj: Any, size: int):
+        self.invalidate(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (obj, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+
+    def invalidate(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+# what callers get out of the local tier, so they can't change the cached original.
+# Document builders copy themselves, they hold the configuration and session
+def copy_hydrated(obj: Any) -> Any:
+    if isinstance(obj, DocumentBuilder):
+        return obj.copy()
+    return copy.deepcopy(obj)
+
 
 class ScraperCache:
     """
     Handles caching of scraped data at different levels (Vorgang and Dokumente).
-    Provides methods to read from and write to cache using Redis.
+    Provides methods to read from and write to cache using Redis, or any other
+    CacheBackend passed in. All of them are coroutines, see SyncScraperCache
+    for use outside of an event loop.
     """
 
-    redis_client: Optional[redis.Redis] = None
+    backend: Optional[CacheBackend] = None
     default_expiration_min: int = 60 * 24 * 14  # fortnite
     disabled: bool = False
 
@@ -28,24 +171,32 @@ class ScraperCache:
         redis_port: int,
         default_expiration_min: int = None,
         disabled: bool = False,
+        max_connections: int = 32,
+        ttl_min: Dict[str, int] = None,
+        compression: str = "auto",
+        local_max_mib: int = 64,
+        backend: CacheBackend = None,
     ):
         global logger
         self.disabled = disabled
+        self.ttl_min = {**DEFAULT_TTL_MIN, **(ttl_min or {})}
+        self.codec = resolve_codec(compression)
+        self.local = LocalTier(int(local_max_mib) * 2**20)
+        self.backend_hits = 0
+        self.backend_misses = 0
+        if default_expiration_min is not None:
+            self.default_expiration_min = int(default_expiration_min)
+
+        if backend is not None:
+            self.backend = backend
+            return
         if disabled or redis_host is None or redis_port is None:
             self.disabled = True
             logger.warning("Cacheing disabled")
             return
 
-        if default_expiration_min:
-            self.cache_expiry_minutes = default_expiration_min
-
         try:
-            self.redis_client = redis.Redis(
-                host=redis_host, port=redis_port, decode_responses=True
-            )
-            # Test connection
-            self.redis_client.ping()
-            logger.info(f"Connected to Redis at {redis_host}:{redis_port}")
+            self.backend = RedisBackend(redis_host, redis_port, max_connections)
         except redis.ConnectionError as e:
             logger.error(f"Failed to connect to Redis: {e}")
             sys.exit(1)
@@ -53,14 +204,53 @@ class ScraperCache:
             logger.error(f"Unexpected error connecting to Redis: {e}")
             sys.exit(1)
 
-    def store_raw(
+    # releases the backend's resources of the running loop, call before it ends.
+    # The local tier only lives for a cycle, so the backend's expiry stays
+    # authoritative
+    async def close(self):
+        self.local.clear()
+        if self.disabled:
+            return
+        await self.backend.close()
+
+    # seconds until key expires, None if it doesn't. expiry (in minutes) overrides
+    # the ttl of the key's prefix, the longest matching prefix wins
+    def expiry_s(self, key: str, expiry: int = None) -> Optional[int]:
+        if expiry is None:
+            expiry = self.default_expiration_min
+            matched = ""
+            for prefix, minutes in self.ttl_min.items():
+                if key.startswith(prefix) and len(prefix) > len(matched):
+                    matched, expiry = prefix, minutes
+        if not expiry:
+            return None
+        return int(expiry) * 60
+
+    # the bytes stored for value under key
+    def encode(self, key: str, value: str) -> bytes:
+        if key.startswith(COMPRESSED_PREFIXES):
+            return encode_value(value, self.codec)
+        return encode_value(value, None)
+
+    # the string stored under key, None if it is missing or unreadable
+    def decode(self, key: str, raw: Optional[bytes]) -> Optional[str]:
+        try:
+            return decode_value(raw)
+        except Exception as e:
+            logger.error(f"Unable to decode cached value of key `{key}`: {e}")
+            return None
+
+    async def store_raw(
         self, key: str, value: str, typehint: str = "Raw Value", expiry: int = None
     ):
         if self.disabled:
             return True
+        self.local.invalidate(key)
         try:
             logger.debug(f"Storing raw kv-pair with key `{key}`")
-            success = self.redis_client.set(key, value)
+            success = await self.backend.set(
+                key, self.encode(key, value), self.expiry_s(key, expiry)
+            )
             if not success:
                 logger.warning(f"Storing {typehint} (key=`{key}`) failed!")
                 return False
@@ -69,25 +259,171 @@ class ScraperCache:
             logger.error(f"Error storing raw value with key `{key}`")
             return False
 
-    def get_raw(self, key: str, typehint: str = "Raw Value") -> Optional[str]:
+    async def get_raw(self, key: str, typehint: str = "Raw Value") -> Optional[str]:
         if self.disabled:
             return None
         try:
-            success = self.redis_client.get(key)
+            success = self.decode(key, await self.backend.get(key))
             if not success:
                 logger.debug(f"{typehint} (key=`{key}`) not found in cache")
+                self.backend_misses += 1
                 return None
+            self.backend_hits += 1
             return success
         except Exception as e:
             logger.error(f"Error retrieving raw value with key `{key}`")
 
-    def store_vorgang(self, key: str, value: models.Vorgang, expiry: int = None):
-        value = json.dumps(sanitize_for_serialization(value))
-        key = f"vg:{key}"
-        return self.store_raw(key, value, "Vorgang")
+    # one round-trip for many keys, None for the ones not cached
+    async def get_many(
+        self, keys: List[str], typehint: str = "Raw Value"
+    ) -> List[Optional[str]]:
+        if self.disabled or not keys:
+            return [None] * len(keys)
+        try:
+            raw = await self.backend.mget(keys)
+            values = [self.decode(key, value) for key, value in zip(keys, raw)]
+            found = sum(v is not None for v in values)
+            self.backend_hits += found
+            self.backend_misses += len(keys) - found
+            logger.debug(f"{found}/{len(keys)} {typehint} keys found in cache")
+            return values
+        except Exception as e:
+            logger.error(f"Error retrieving {len(keys)} raw values: {e}")
+            return [None] * len(keys)
 
-    def store_dokument(self, key: str, value: DocumentBuilder, expiry: int = None):
-        """Store Document data in Redis cache
+    # wether each of the keys is cached, in one round-trip and without
+    # transferring (or decompressing) the values
+    async def exists_many(
+        self, keys: List[str], typehint: str = "Raw Value"
+    ) -> List[bool]:
+        if self.disabled or not keys:
+            return [False] * len(keys)
+        try:
+            exists = await self.backend.exists_many(keys)
+            found = sum(exists)
+            self.backend_hits += found
+            self.backend_misses += len(keys) - found
+            logger.debug(f"{found}/{len(keys)} {typehint} keys found in cache")
+            return exists
+        except Exception as e:
+            logger.error(f"Error checking {len(keys)} keys: {e}")
+            return [False] * len(keys)
+
+    # stores all kv-pairs in one pipelined round-trip
+    async def store_many(
+        self, items: Dict[str, str], typehint: str = "Raw Value", expiry: int = None
+    ) -> bool:
+        if self.disabled or not items:
+            return True
+        for key in items:
+            self.local.invalidate(key)
+        try:
+            results = await self.backend.set_many(
+                {
+                    key: (self.encode(key, value), self.expiry_s(key, expiry))
+                    for key, value in items.items()
+                }
+            )
+            if not all(results):
+                logger.warning(f"Storing {len(items)} {typehint} values failed partly!")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Error storing {len(items)} raw values: {e}")
+            return False
+
+    # hydrated objects of the given keys, None where there is nothing (readable)
+    # cached. Hydrated entries are kept in the local tier, so a key read again in
+    # this process skips both the backend and hydrate. Every caller gets a copy
+    # hydrate is a function from the cached string to the object, or a list with
+    # one function per key
+    async def get_hydrated_many(
+        self,
+        keys: List[str],
+        hydrate: Callable[[str], Any] | List[Callable[[str], Any]],
+        typehint: str = "Raw Value",
+    ) -> List[Optional[Any]]:
+        if not isinstance(hydrate, list):
+            hydrate = [hydrate] * len(keys)
+        results = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            obj = self.local.get(key)
+            if obj is None:
+                missing.append(i)
+            else:
+                results[i] = copy_hydrated(obj)
+        raws = await self.get_many([keys[i] for i in missing], typehint)
+        for i, raw in zip(missing, raws):
+            if raw is None:
+                continue
+            try:
+                obj = hydrate[i](raw)
+            except Exception as e:
+                logger.error(f"Unable to hydrate {typehint} (key=`{keys[i]}`): {e}")
+                continue
+            self.local.put(keys[i], obj, len(raw))
+            results[i] = copy_hydrated(obj)
+        return results
+
+    async def get_hydrated(
+        self, key: str, hydrate: Callable[[str], Any], typehint: str = "Raw Value"
+    ) -> Optional[Any]:
+        return (await self.get_hydrated_many([key], hydrate, typehint))[0]
+
+    # hits and misses of the local tier and the backend (Redis or SQLite)
+    def hit_rates(self) -> Dict[str, tuple]:
+        return {
+            "local": (self.local.hits, self.local.misses),
+            "backend": (self.backend_hits, self.backend_misses),
+        }
+
+    def log_hit_rates(self):
+        for tier, (hits, misses) in self.hit_rates().items():
+            rate = hits / (hits + misses) if hits + misses else 0
+            logger.info(f"Cache tier {tier}: {hits} hits, {misses} misses ({rate:.1%})")
+        logger.info(
+            f"Cache tier local holds {len(self.local.entries)} entries, {self.local.bytes / 2**20:.1f}/{self.local.max_bytes / 2**20:.0f} MiB"
+        )
+
+    # fingerprint: of what the Vorgang was extracted from, stored beside it in the
+    # same round-trip, see get_vorgang_fingerprints. So is its api_id (vgid:), which
+    # outlives the Vorgang: one extracted anew keeps the id the backend knows it by
+    async def store_vorgang(
+        self,
+        key: str,
+        value: models.Vorgang,
+        expiry: int = None,
+        fingerprint: Optional[str] = None,
+    ):
+        items = {
+            f"vg:{key}": json.dumps(sanitize_for_serialization(value)),
+            f"vgid:{key}": str(value.api_id),
+        }
+        if fingerprint is not None:
+            items[f"vgfp:{key}"] = fingerprint
+        return await self.store_many(items, "Vorgang", expiry)
+
+    async def store_vorgang_api_ids(self, api_ids: Dict[str, str]):
+        return await self.store_many(
+            {f"vgid:{key}": api_id for key, api_id in api_ids.items()},
+            "Vorgang ApiID",
+        )
+
+    # the api_ids Vorgänge were last stored with, None where there is none
+    async def get_vorgang_api_ids(self, keys: List[str]) -> List[Optional[str]]:
+        return await self.get_many([f"vgid:{key}" for key in keys], "Vorgang ApiID")
+
+    # the fingerprints stored with the Vorgänge, None where there is none
+    async def get_vorgang_fingerprints(self, keys: List[str]) -> List[Optional[str]]:
+        return await self.get_many(
+            [f"vgfp:{key}" for key in keys], "Vorgang Fingerprint"
+        )
+
+    async def store_dokument(
+        self, key: str, value: DocumentBuilder, expiry: int = None
+    ):
+        """Store Document data in the cache
 
         Only caches documents that were successfully downloaded and processed
         """
@@ -103,40 +439,129 @@ class ScraperCache:
 
         key = f"dok:{key}"
         value = value.to_json()
-        return self.store_raw(key, value, "Dokument")
+        return await self.store_raw(key, value, "Dokument", expiry)
 
-    def get_vorgang(self, key: str) -> Optional[models.Vorgang]:
-        key = f"vg:{key}"
-        ret = self.get_raw(key, "Vorgang")
-        if ret is None:
-            return None
-        return models.Vorgang.from_json(ret)
+    async def get_vorgang(self, key: str) -> Optional[models.Vorgang]:
+        return await self.get_hydrated(f"vg:{key}", models.Vorgang.from_json, "Vorgang")
+
+    # wether the Vorgänge are cached, without fetching them
+    async def has_vorgaenge(self, keys: List[str]) -> List[bool]:
+        return await self.exists_many([f"vg:{key}" for key in keys], "Vorgang")
+
+    # returns the documents as built by the from_json of the respective builder class
+    async def get_dokument_objects(
+        self, keys: List[str], hydrate: List[Callable[[str], DocumentBuilder]]
+    ) -> List[Optional[DocumentBuilder]]:
+        return await self.get_hydrated_many(
+            [f"dok:{key}" for key in keys], hydrate, "Dokument"
+        )
 
     # returns the document as json string, the caller must know the exact type
     # since DocumentBuilder is Abstract
-    def get_dokument(self, key: str) -> Optional[str]:
+    async def get_dokument(self, key: str) -> Optional[str]:
         key = f"dok:{key}"
-        ret = self.get_raw(key, "Dokument")
+        ret = await self.get_raw(key, "Dokument")
         if ret is None:
             return None
         return ret
 
-    def store_html(self, key: str, value: str, expiry: int = None):
+    # a page is stored along with what is needed to ask the server wether it changed:
+    # its validators (ETag, Last-Modified), the sha256 of the body and optionally
+    # whatever json-able result the scraper parsed out of it
+    async def store_html(
+        self,
+        key: str,
+        value: str,
+        expiry: int = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        parsed: Any = None,
+    ):
+        entry = {
+            "body": value,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": hashlib.sha256(value.encode("utf-8")).hexdigest(),
+            "parsed": parsed,
+        }
         key = f"html:{key}"
-        return self.store_raw(key, value, "Website")
+        return await self.store_raw(key, json.dumps(entry), "Website", expiry)
 
-    def get_html(self, key: str):
+    # the entry stored by store_html, None if there is none
+    async def get_html_entry(self, key: str) -> Optional[Dict[str, Any]]:
         key = f"html:{key}"
-        return self.get_raw(key, "Website")
+        raw = await self.get_raw(key, "Website")
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Website entry (key=`{key}`): {e}")
+            return None
 
-    def clear(self):
+    async def get_html(self, key: str) -> Optional[str]:
+        entry = await self.get_html_entry(key)
+        return entry["body"] if entry else None
+
+    # OCR output is keyed by the sha256 of the pdf, so it survives url changes
+    # and failures further down the extraction
+    async def store_ocr_text(self, doc_hash: str, value: str, expiry: int = None):
+        key = f"ocr:{doc_hash}"
+        return await self.store_raw(key, value, "OCR Text", expiry)
+
+    async def get_ocr_text(self, doc_hash: str) -> Optional[str]:
+        key = f"ocr:{doc_hash}"
+        return await self.get_raw(key, "OCR Text")
+
+    # walks all keys and sums them up by prefix (up to and including the first `:`):
+    # {prefix: (number of keys, bytes used, number of keys without ttl)}
+    # bytes are as the backend accounts them, see CacheBackend.entries
+    async def memory_report(self) -> Dict[str, tuple]:
+        report = {}
+        if self.disabled:
+            return report
+        async for entries in self.backend.entries():
+            for key, size, expires in entries:
+                prefix = key.split(":", 1)[0] + ":" if ":" in key else ""
+                count, nbytes, persistent = report.get(prefix, (0, 0, 0))
+                report[prefix] = (count + 1, nbytes + size, persistent + (not expires))
+        return report
+
+    async def clear(self):
         """Clear all cache data"""
         if self.disabled:
             return True
+        self.local.clear()
         try:
-            self.redis_client.flushall()
+            await self.backend.clear()
             logger.info("Cache cleared")
             return True
         except Exception as e:
             logger.error(f"Error clearing cache: {e}")
             return False
+
+
+class SyncScraperCache:
+    """
+    Blocking facade of a ScraperCache for code without an event loop, e.g. tests.
+    Every call runs the coroutine of the same name on a loop of its own.
+    """
+
+    def __init__(self, cache: ScraperCache):
+        self.cache = cache
+
+    def __getattr__(self, name):
+        method = getattr(self.cache, name)
+        if not inspect.iscoroutinefunction(method):
+            return method
+
+        def run(*args, **kwargs):
+            async def call():
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    await self.cache.close()
+
+            return asyncio.run(call())
+
+        return run
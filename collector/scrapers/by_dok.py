@@ -1,13 +1,12 @@
 import re
+from collector.convert import hydrate_model
 from collector.document_builder import DocumentBuilder
-from collector.tesseract_wrapper import extract_ocr_text
+from collector.pdf_extraction import extract_pdf_off_loop
 from openapi_client import models
 import logging
 import datetime
-import hashlib
 import os
 import uuid
-from kreuzberg import ExtractionConfig, extract_file, TesseractConfig
 import toml
 
 logger = logging.getLogger("collector")
@@ -106,35 +105,11 @@ class BayernDokument(DocumentBuilder):
 
         extract = ExtractionResult()
         try:
-            doc_hash = None
-            with open(self.local_path, "rb") as f:
-                # Calculate file hash for document identification
-                f.seek(0)
-                doc_hash = hashlib.file_digest(f, "sha256").hexdigest()
-
-            # Extract text from all pages
-            run_successful = False
-
+            # Extract text from all pages and hash the file, off the event loop
             try:
-                kreuzberg_extract = await extract_file(
-                    self.local_path,
-                    config=ExtractionConfig(
-                        force_ocr=False,
-                    ),
-                )
-                extract.metadata = kreuzberg_extract.metadata
-                run_successful = (
-                    kreuzberg_extract.content is not None
-                    and len(kreuzberg_extract.content) > 64
+                extract.content, extract.metadata, doc_hash = (
+                    await extract_pdf_off_loop(self.config, self.local_path)
                 )
-
-                if not run_successful:
-                    logger.warning(
-                        f"Normal extraction failed. Retrying with OCR. This might take a while."
-                    )
-                    extract.content = extract_ocr_text(self.local_path)
-                else:
-                    extract.content = kreuzberg_extract.content
                 assert extract.content is not None
             except Exception as e:
                 logger.warning(
@@ -182,19 +157,22 @@ class BayernDokument(DocumentBuilder):
             "url": self.url,
         }
 
+    # dic comes from to_dict, so the output is validated in one pass, see hydrate_model.
+    # Pass the caller's config and session, a fresh configuration is only the fallback
     @classmethod
-    def from_dict(cls, dic):
-        from collector.config import CollectorConfiguration
-
-        logger.debug(f"called BayernDokument@from_dict with {dic}")
-        config = CollectorConfiguration()
-        inst = cls(dic["typehint"], dic["url"], None, config)
-        inst.output = models.Dokument.from_dict(dic["output"])
+    def from_dict(cls, dic, config=None, session=None):
+        if config is None:
+            from collector.config import CollectorConfiguration
+
+            config = CollectorConfiguration()
+        logger.debug(f"called BayernDokument@from_dict for {dic['url']}")
+        inst = cls(dic["typehint"], dic["url"], session, config)
+        if dic["output"] is not None:
+            inst.output = hydrate_model(models.Dokument, dic["output"])
         inst.local_path = dic["local_path"]
         inst.trojanergefahr = (
             int(dic["trojanergefahr"]) if dic["trojanergefahr"] else None
         )
-        print(dic["tops"])
         inst.tops = dic["tops"]
         return inst
 
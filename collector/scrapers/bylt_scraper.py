@@ -4,6 +4,9 @@ import re
 import asyncio
 import uuid
 import datetime  # required because of the eval() call later down the line
+import json
+from hashlib import sha256
+from typing import Optional
 from datetime import date as dt_date
 from datetime import datetime as dt_datetime
 import aiohttp
@@ -11,7 +14,9 @@ from bs4 import BeautifulSoup
 
 from openapi_client.models import *
 
+from collector.convert import sanitize_for_serialization
 from collector.interface import VorgangsScraper
+from collector.document_builder import DocumentBuilder, build_documents
 from collector.tesseract_wrapper import check_availability
 
 from collector.scrapers.by_dok import *
@@ -41,15 +46,17 @@ class BYLTScraper(VorgangsScraper):
         # Add headers for API key authentication
         self.session.headers.update({"api-key": config.api_key})
         self.lock = asyncio.Lock()
+        # url -> fingerprint of the rows the Vorgang was extracted from, until it is cached
+        self.fingerprints = {}
 
     async def listing_page_extractor(self, url) -> list[str]:
         global logger
         # assumes a full page without pagination
         logger.debug(f"Extracting Listing Page `{url}`")
-        soup = None
-        async with self.session.get(url) as get_result:
-            soup = BeautifulSoup(await get_result.text(), "html.parser")
-        return await self.soup_to_listing(soup)
+        # the listing is only parsed again if the page changed
+        return await self.fetch_parsed(
+            url, lambda text: self.soup_to_listing(BeautifulSoup(text, "html.parser"))
+        )
 
     async def soup_to_listing(self, soup):
         # finds all result boxes
@@ -67,14 +74,99 @@ class BYLTScraper(VorgangsScraper):
 
     async def item_extractor(self, listing_item) -> Vorgang:
         global logger, NULL_UUID
-        soup = None
-        async with self.session.get(listing_item) as get_result:
-            soup = BeautifulSoup(await get_result.text(), "html.parser")
+        soup = BeautifulSoup(await self.fetch_text(listing_item), "html.parser")
         return await self.soup_to_item(listing_item, soup)
 
+    # a cached Vorgang is stale once the rows of its table changed. The pages are
+    # fetched conditionally and their fingerprint is cached along with them, so an
+    # unchanged page costs a 304 and no parsing
+    async def get_stale_keys(self, items, item_keys):
+        stored, api_ids = await asyncio.gather(
+            self.config.cache.get_vorgang_fingerprints(item_keys),
+            self.config.cache.get_vorgang_api_ids(item_keys),
+        )
+        current = await self.schedule_items(
+            items, lambda url: self.fetch_parsed(url, self.page_fingerprint)
+        )
+        stale_keys = set()
+        for item, key, old, new in zip(items, item_keys, stored, current):
+            if isinstance(new, Exception):
+                logger.warning(
+                    f"Unable to check `{item}` for changes, keeping the cached Vorgang: {new}"
+                )
+            elif old != new:
+                # also if it was cached without a fingerprint: rows may have been
+                # added since, so it is extracted in full once, storing one
+                logger.debug(f"Rows of `{item}` changed")
+                stale_keys.add(key)
+
+        # Vorgänge cached before their api_id was stored apart get it stored now,
+        # before they expire. Stale ones are stored with it once extracted
+        missing = [
+            key
+            for key, api_id in zip(item_keys, api_ids)
+            if api_id is None and key not in stale_keys
+        ]
+        if missing:
+            cached = await asyncio.gather(
+                *[self.config.cache.get_vorgang(key) for key in missing]
+            )
+            await self.config.cache.store_vorgang_api_ids(
+                {key: str(vg.api_id) for key, vg in zip(missing, cached) if vg}
+            )
+        return stale_keys
+
+    async def page_fingerprint(self, text: str) -> str:
+        soup = BeautifulSoup(text, "html.parser")
+        vorgangs_table = soup.find("tbody", id="vorgangsanzeigedokumente_data")
+        return fingerprint_rows(vorgangs_table.find_all("tr"))
+
+    async def store_extracted_result(self, item_key, result):
+        await self.config.cache.store_vorgang(
+            item_key, result, fingerprint=self.fingerprints.pop(item_key, None)
+        )
+
+    # the fingerprint travels with an unsent Vorgang through the outbox, so the one
+    # stored once it is sent matches the rows it was extracted from. Otherwise the
+    # rows it was updated with would look new (again) to soup_to_item
+    def serialize_result(self, result, item_key):
+        return json.dumps(
+            {
+                "vorgang": sanitize_for_serialization(result),
+                "fingerprint": self.fingerprints.pop(item_key, None),
+            }
+        )
+
+    def deserialize_result(self, payload, item_key):
+        entry = json.loads(payload)
+        if "vorgang" not in entry:
+            # deferred as a plain Vorgang, see VorgangsScraper.serialize_result
+            return super().deserialize_result(payload, item_key)
+        if entry["fingerprint"] is not None:
+            self.fingerprints[item_key] = entry["fingerprint"]
+        return Vorgang.from_dict(entry["vorgang"])
+
+    # Incremental Update
+    # A Vorgang that is cached along with the rows it was extracted from (see
+    # fingerprint_rows) is updated in place if rows were only appended since:
+    # only the documents of the new rows are built and their stations are
+    # appended to (or merged into) the cached ones with the usual rules.
+    # If rows changed or disappeared the Vorgang is extracted from scratch, but
+    # keeps its api_id either way, even once the cached Vorgang expired
     async def soup_to_item(self, listing_item, soup):
         vorgangs_table = soup.find("tbody", id="vorgangsanzeigedokumente_data")
-        rows = vorgangs_table.find_all("tr")
+        rows = [
+            row for row in vorgangs_table.find_all("tr") if not is_announcement(row)
+        ]
+        hashes = [row_hash(row) for row in rows]
+        key = await self.make_cache_key(listing_item)
+        self.fingerprints[key] = "\n".join(hashes)
+        cached, [cached_fingerprint], [api_id] = await asyncio.gather(
+            self.config.cache.get_vorgang(key),
+            self.config.cache.get_vorgang_fingerprints([key]),
+            self.config.cache.get_vorgang_api_ids([key]),
+        )
+        known_rows = cached_fingerprint.split("\n") if cached_fingerprint else None
 
         btext_soup = soup.find("span", id="basistext")
         assert (
@@ -88,6 +180,66 @@ class BYLTScraper(VorgangsScraper):
             .replace("\r", " ")
             .strip()
         )
+        if (
+            cached is not None
+            and known_rows is not None
+            and hashes[: len(known_rows)] == known_rows
+        ):
+            vg = cached
+            rows = rows[len(known_rows) :]
+            logger.info(
+                f"Updating Vorgang `{vg.api_id}` with {len(rows)} new rows: {listing_item}"
+            )
+        else:
+            vg = self.new_vorgang(listing_item, soup, inds, titel)
+            if cached is not None:
+                vg.api_id = cached.api_id
+            elif api_id is not None:
+                # the Vorgang expired, its api_id did not
+                vg.api_id = api_id
+
+        logger.debug(f"extracting {len(rows)} table rows into stations")
+        # first pass: turn every table row into a row descriptor and
+        # collect the documents it needs
+        descriptors = []
+        for row in rows:
+            descriptor = self.describe_row(listing_item, row, inds)
+            if descriptor is not None:
+                descriptors.append(descriptor)
+
+        # start the builds of all documents of this Vorgang at once, bounded
+        builders = [b for d in descriptors for b in d["builders"]]
+        pending = [b for b in builders if isinstance(b, DocumentBuilder)]
+        # a Stellungnahme that fails is skipped, any other document fails the Vorgang
+        optional = [
+            b
+            for d in descriptors
+            if d["cellclass"] == "stellungnahme"
+            for b in d["builders"]
+        ]
+        built = iter(
+            await build_documents(pending, self.max_documents_in_flight(), optional)
+        )
+        built = [next(built) if isinstance(b, DocumentBuilder) else b for b in builders]
+        offset = 0
+        for descriptor in descriptors:
+            count = len(descriptor["builders"])
+            descriptor["docs"] = built[offset : offset + count]
+            offset += count
+
+        # second pass: assemble the stations in row order
+        self.assemble_stations(vg, listing_item, descriptors)
+
+        async with self.lock:
+            self.items_done += 1
+        logger.info(
+            f"Extraction Progress: {self.items_done}/{self.item_count} items, ({(self.items_done / self.item_count):.1%}) {listing_item}"
+        )
+
+        return vg
+
+    # a Vorgang without stations from the head of its page
+    def new_vorgang(self, listing_item, soup, inds, titel) -> Vorgang:
         vg = Vorgang.from_dict(
             {
                 "api_id": (str(uuid.uuid4())),
@@ -125,7 +277,132 @@ class BYLTScraper(VorgangsScraper):
         assert (
             len(vg.initiatoren) > 0
         ), f"Error: Could not find Initiatoren for url {listing_item}"
+        return vg
+
+    # turns a single row of the vorgangs table into a descriptor of the station it
+    # describes and the (not yet built) documents that are required for it.
+    # Returns None for rows that do not contribute to the Vorgang
+    def describe_row(self, listing_item, row, inds) -> Optional[dict]:
+        cells = row.find_all("td")
+
+        assert (
+            len(cells) == 2
+        ), f"Warning: Unexpectedly found more or less than exactly two gridcells in: `{row}` of url `{listing_item}`"
+
+        # date is in the first cell. If its just an announcement, just skip it
+        if cells[0].text == "Beratung / Ergebnis folgt":
+            return None
+        timestamp = cells[0].text.split(".")
+        assert (
+            len(timestamp) == 3
+        ), f"Error: Unexpected date format: `{timestamp}` of url `{listing_item}`"
+        timestamp = dt_datetime(
+            year=int(timestamp[2]),
+            month=int(timestamp[1]),
+            day=int(timestamp[0]),
+            hour=0,
+            minute=0,
+            second=0,
+        ).astimezone(datetime.timezone.utc)
+        # content is in the second cell
+
+        cellclass = classify_cell(cells[1])
+        descriptor = {
+            "cellclass": cellclass,
+            "timestamp": timestamp,
+            "builders": [],
+        }
+
+        if cellclass == "initiativ":
+            link = extract_singlelink(cells[1])
+            descriptor["link"] = link
+            descriptor["builders"] = [
+                ByGesetzentwurf(
+                    models.Doktyp.ENTWURF,
+                    link,
+                    self.session,
+                    self.config,
+                ).with_drucksnr(str(inds))
+            ]
+        elif cellclass == "unknown":
+            logger.warning(
+                f"Unknown Cell class for VG {listing_item}\nContents: {cells[1].text}"
+            )
+            return None
+        elif cellclass == "ignored":
+            return None
+        elif cellclass == "stellungnahme":
+            descriptor["stellungnahmen"] = extract_schrstellung(cells[1])
+            for stln_urls in descriptor["stellungnahmen"]:
+                # a failing Stellungnahme is skipped, not fatal for the Vorgang
+                try:
+                    builder = ByStellungnahme(
+                        models.Doktyp.STELLUNGNAHME,
+                        stln_urls["stellungnahme"],
+                        self.session,
+                        self.config,
+                    )
+                except Exception as e:
+                    builder = e
+                descriptor["builders"].append(builder)
+        elif cellclass.startswith("plenum-proto"):
+            pproto = extract_plenproto(cells[1])
+            descriptor["video"] = pproto.get("video")
+            descriptor["builders"] = [
+                ByRedeprotokoll(
+                    models.Doktyp.REDEPROTOKOLL,
+                    pproto["pprotoaz"],
+                    self.session,
+                    self.config,
+                )
+            ]
+        elif cellclass == "rueckzug":
+            descriptor["builders"] = [
+                ByMitteilung(
+                    models.Doktyp.MITTEILUNG,
+                    extract_singlelink(cells[1]),
+                    self.session,
+                    self.config,
+                ).with_drucksnr(extract_drucksnr(cells[1]))
+            ]
+        elif cellclass.startswith("plenum-beschluss"):
+            descriptor["builders"] = [
+                ByGesetzentwurf(
+                    models.Doktyp.ENTWURF,
+                    extract_singlelink(cells[1]),
+                    self.session,
+                    self.config,
+                ).with_drucksnr(extract_drucksnr(cells[1]))
+            ]
+        elif cellclass == "ausschuss-bse":
+            descriptor["builders"] = [
+                ByBeschlussempfehlung(
+                    models.Doktyp.BESCHLUSSEMPF,
+                    extract_singlelink(cells[1]),
+                    self.session,
+                    self.config,
+                ).with_drucksnr(extract_drucksnr(cells[1]))
+            ]
+            descriptor["ausschuss_name"] = cells[1].text.split("\n")[1]
+        elif cellclass == "gsblatt":
+            descriptor["builders"] = [
+                ByGesetzentwurf(
+                    models.Doktyp.SONSTIG,
+                    extract_singlelink(cells[1]),
+                    self.session,
+                    self.config,
+                )
+            ]
+        else:
+            logger.error(
+                f"Reached an unreachable state with cellclass: {cellclass}. Discarded."
+            )
+            return None
+        return descriptor
 
+    # assembles the described rows with their built documents ("docs") into
+    # stations of vg, merging them into the existing stations where applicable
+    def assemble_stations(self, vg: Vorgang, listing_item, descriptors: list[dict]):
         # Helper function to check if a station is a plenary session
         def is_plenary_session(station_typ):
             return station_typ in [
@@ -156,38 +433,14 @@ class BYLTScraper(VorgangsScraper):
             # No matching station found
             return -1
 
-        logger.debug(f"extracting {len(rows)} table rows into stations")
-        # station extraction
-        for row in rows:
-            cells = row.find_all("td")
-
-            assert (
-                len(cells) == 2
-            ), f"Warning: Unexpectedly found more or less than exactly two gridcells in: `{row}` of url `{listing_item}`"
-
-            # date is in the first cell. If its just an announcement, just skip it
-            if cells[0].text == "Beratung / Ergebnis folgt":
-                continue
-            timestamp = cells[0].text.split(".")
-            assert (
-                len(timestamp) == 3
-            ), f"Error: Unexpected date format: `{timestamp}` of url `{listing_item}`"
-            timestamp = dt_datetime(
-                year=int(timestamp[2]),
-                month=int(timestamp[1]),
-                day=int(timestamp[0]),
-                hour=0,
-                minute=0,
-                second=0,
-            ).astimezone(datetime.timezone.utc)
-            # content is in the second cell
-
-            cellclass = classify_cell(cells[1])
+        for descriptor in descriptors:
+            cellclass = descriptor["cellclass"]
+            docs = descriptor["docs"]
 
             ### Initialize Station scaffold
             stat = models.Station.from_dict(
                 {
-                    "zp_start": timestamp,
+                    "zp_start": descriptor["timestamp"],
                     "dokumente": [],
                     "link": listing_item,
                     "gremium": models.Gremium.from_dict(
@@ -207,31 +460,14 @@ class BYLTScraper(VorgangsScraper):
             ## initiativ
             ## has: one doklink, drucksnr, new station
             if cellclass == "initiativ":
-                link = extract_singlelink(cells[1])
-                vg.links.append(link)
+                vg.links.append(descriptor["link"])
                 stat.typ = "parl-initiativ"
                 stat.gremium = models.Gremium.from_dict(
                     {"name": "plenum", "parlament": "BY", "wahlperiode": CURRENT_WP}
                 )
-                dok = (
-                    await ByGesetzentwurf(
-                        models.Doktyp.ENTWURF,
-                        link,
-                        self.session,
-                        self.config,
-                    )
-                    .with_drucksnr(str(inds))
-                    .build()
-                )
+                dok = docs[0]
                 stat.dokumente = [models.StationDokumenteInner(dok.output)]
                 stat.trojanergefahr = max(dok.trojanergefahr, 1)
-            elif cellclass == "unknown":
-                logger.warning(
-                    f"Unknown Cell class for VG {listing_item}\nContents: {cells[1].text}"
-                )
-                continue
-            elif cellclass == "ignored":
-                continue
             ## stellungnahme
             ## is added to the exactly preceding station
             ## has: one doklink, name des/der stellungnehmenden (=autor)
@@ -239,17 +475,9 @@ class BYLTScraper(VorgangsScraper):
                 assert (
                     len(vg.stationen) > 0
                 ), "Error: Stellungnahme ohne Vorhergehenden Gesetzestext"
-                stln_raw = extract_schrstellung(cells[1])
-
-                for stln_urls in stln_raw:
-                    try:
-                        dok = await ByStellungnahme(
-                            models.Doktyp.STELLUNGNAHME,
-                            stln_urls["stellungnahme"],
-                            self.session,
-                            self.config,
-                        ).build()
-                    except Exception as e:
+
+                for stln_urls, dok in zip(descriptor["stellungnahmen"], docs):
+                    if isinstance(dok, Exception):
                         logger.warning("Skipping Stellungnahme since extraction failed")
                         continue
 
@@ -281,18 +509,12 @@ class BYLTScraper(VorgangsScraper):
             ## has: link(plenarprotokoll), link(Auszug-plenarprotokoll), link(Videoausschnitt)
             ## neue station oder merge
             elif cellclass.startswith("plenum-proto"):
-                pproto = extract_plenproto(cells[1])
                 gremium = models.Gremium.from_dict(
                     {"name": "plenum", "parlament": "BY", "wahlperiode": CURRENT_WP}
                 )
-                dok = await ByRedeprotokoll(
-                    models.Doktyp.REDEPROTOKOLL,
-                    pproto["pprotoaz"],
-                    self.session,
-                    self.config,
-                ).build()
+                dok = docs[0]
                 typ = None
-                video_link = pproto.get("video")
+                video_link = descriptor["video"]
                 if cellclass == "plenum-proto-uebrw":
                     typ = "parl-vollvlsgn"
                 elif cellclass == "plenum-proto-zustm":
@@ -320,16 +542,7 @@ class BYLTScraper(VorgangsScraper):
             ## Rückzugsmitteilung
             ## Ein Link
             elif cellclass == "rueckzug":
-                dok = (
-                    await ByMitteilung(
-                        models.Doktyp.MITTEILUNG,
-                        extract_singlelink(cells[1]),
-                        self.session,
-                        self.config,
-                    )
-                    .with_drucksnr(extract_drucksnr(cells[1]))
-                    .build()
-                )
+                dok = docs[0]
 
                 typ = models.Stationstyp.PARL_MINUS_ZURUECKGZ
                 gremium = models.Gremium.from_dict(
@@ -350,16 +563,7 @@ class BYLTScraper(VorgangsScraper):
             ## Plenumsentscheidung
             ## hat einen Dokumentenlink
             elif cellclass.startswith("plenum-beschluss"):
-                dok = (
-                    await ByGesetzentwurf(
-                        models.Doktyp.ENTWURF,
-                        extract_singlelink(cells[1]),
-                        self.session,
-                        self.config,
-                    )
-                    .with_drucksnr(extract_drucksnr(cells[1]))
-                    .build()
-                )
+                dok = docs[0]
 
                 typ = None
                 trojanergefahr = max(dok.trojanergefahr, 1)
@@ -387,19 +591,8 @@ class BYLTScraper(VorgangsScraper):
             ## hat 1 Link: Beschlussempfehlung
             ## doppelt sich manchmal aus unbekannten Gründen
             elif cellclass == "ausschuss-bse":
-                dok = (
-                    await ByBeschlussempfehlung(
-                        models.Doktyp.BESCHLUSSEMPF,
-                        extract_singlelink(cells[1]),
-                        self.session,
-                        self.config,
-                    )
-                    .with_drucksnr(extract_drucksnr(cells[1]))
-                    .build()
-                )
-
-                soup: BeautifulSoup = cells[1]
-                ausschuss_name = soup.text.split("\n")[1]
+                dok = docs[0]
+                ausschuss_name = descriptor["ausschuss_name"]
 
                 # Check if there's an existing committee station to merge with
                 existing_idx = find_matching_committee_station(ausschuss_name)
@@ -443,30 +636,13 @@ class BYLTScraper(VorgangsScraper):
                     }
                 )
                 stat.typ = "postparl-gsblt"
-                dok = await ByGesetzentwurf(
-                    models.Doktyp.SONSTIG,
-                    extract_singlelink(cells[1]),
-                    self.session,
-                    self.config,
-                ).build()
+                dok = docs[0]
                 stat.dokumente = [models.StationDokumenteInner(dok.output)]
-            else:
-                logger.error(
-                    f"Reached an unreachable state with cellclass: {cellclass}. Discarded."
-                )
-                continue
             stat.dokumente = dedup_drucks(stat.dokumente)
             logger.debug(
                 f"Adding New Station of class `{'' + stat.typ}` to Vorgang `{vg.api_id}`"
             )
             vg.stationen.append(stat)
-        async with self.lock:
-            self.items_done += 1
-        logger.info(
-            f"Extraction Progress: {self.items_done}/{self.item_count} items, ({(self.items_done / self.item_count):.1%}) {listing_item}"
-        )
-
-        return vg
 
 
 # Cellclasses:
@@ -605,6 +781,26 @@ def extract_gbl_ausz(cellsoup: BeautifulSoup) -> str:
     return cellsoup.findAll("a")[1]["href"]
 
 
+# rows only announcing a future date, they do not contribute to the Vorgang
+def is_announcement(row) -> bool:
+    cells = row.find_all("td")
+    return len(cells) > 0 and cells[0].text.strip() == "Beratung / Ergebnis folgt"
+
+
+# identifies a row of the vorgangs table by its (whitespace normalized) text and links
+def row_hash(row) -> str:
+    cells = [" ".join(cell.text.split()) for cell in row.find_all("td")]
+    links = [str(a["href"]).strip() for a in row.find_all("a", href=True)]
+    return sha256("\x1f".join(cells + links).encode("utf-8")).hexdigest()
+
+
+# the row hashes of a Vorgang's rows, one per line. Changes whenever a row that
+# makes it into the Vorgang is added, removed or changed, and tells which rows are
+# new if rows were only added. See BYLTScraper.soup_to_item
+def fingerprint_rows(rows) -> str:
+    return "\n".join(row_hash(row) for row in rows if not is_announcement(row))
+
+
 async def scrape_single(item):
     from collector.config import CollectorConfiguration
 
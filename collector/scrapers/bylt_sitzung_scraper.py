@@ -13,6 +13,7 @@ from bs4 import BeautifulSoup
 import openapi_client.models as models
 from collector.interface import SitzungsScraper
 from collector.scrapers.by_dok import ByTagesordnung
+from collector.document_builder import build_documents
 
 logger = logging.getLogger("collector")
 NULL_UUID = uuid.UUID("00000000-0000-0000-0000-000000000000")
@@ -47,40 +48,39 @@ class BYLTSitzungScraper(SitzungsScraper):
     # since a single url yields up to six days
     ## List[Tuple[datetime.datetime, FrozenSet[models.Sitzung as BS4]]]
     async def listing_page_extractor(self, url: str) -> List[Any]:
-        async with self.session.get(url) as result:
-            object = json.loads(await result.text())
-            # check if there is actual data contained in this listing
-            if "Diese Woche finden keine Sitzungen statt." in object["html"]:
-                logger.info(f"No Entries in Week listed at url {url}")
-                return []
-            listing_soup = BeautifulSoup(object["html"], "html.parser")
-            listitems = listing_soup.find_all("li")
-
-            day_items = {}
-            current_date = None
-            for li in listitems:
-                if li.get("role") == "heading":
-                    # this is a heading, usually a date
-                    current_date = parse_natural_date(li.text.strip(), 2025)
-                    if current_date is None:
-                        logger.warning(f"Current Date not parsable: {li}")
-                        continue
-                    day_items[current_date] = []
-                elif li.find("div", class_="agenda-item") is not None:
-                    agitem = li.find("div", class_="agenda-item")
-                    # this is an actual entry with a date
-                    title = agitem.find("p", class_="h4").text
-                    if title.startswith("Ausschuss für") or title.startswith(
-                        "Plenarsitzung"
-                    ):
-                        day_items[current_date].append(agitem)
-                else:
+        object = json.loads(await self.fetch_text(url))
+        # check if there is actual data contained in this listing
+        if "Diese Woche finden keine Sitzungen statt." in object["html"]:
+            logger.info(f"No Entries in Week listed at url {url}")
+            return []
+        listing_soup = BeautifulSoup(object["html"], "html.parser")
+        listitems = listing_soup.find_all("li")
+
+        day_items = {}
+        current_date = None
+        for li in listitems:
+            if li.get("role") == "heading":
+                # this is a heading, usually a date
+                current_date = parse_natural_date(li.text.strip(), 2025)
+                if current_date is None:
+                    logger.warning(f"Current Date not parsable: {li}")
                     continue
-            output = []
-            for k, v in day_items.items():
-                output.append((k, frozenset(v)))
-            # an item is a list of individual sessions grouped by day
-            return output
+                day_items[current_date] = []
+            elif li.find("div", class_="agenda-item") is not None:
+                agitem = li.find("div", class_="agenda-item")
+                # this is an actual entry with a date
+                title = agitem.find("p", class_="h4").text
+                if title.startswith("Ausschuss für") or title.startswith(
+                    "Plenarsitzung"
+                ):
+                    day_items[current_date].append(agitem)
+            else:
+                continue
+        output = []
+        for k, v in day_items.items():
+            output.append((k, frozenset(v)))
+        # an item is a list of individual sessions grouped by day
+        return output
 
     ## listing_item: Tuple[datetime.datetime, FrozenSet[models.Sitzung as BS4]]
 
@@ -88,6 +88,8 @@ class BYLTSitzungScraper(SitzungsScraper):
         # a listing item is a pair of (date, [entries])
         termin, sitzungen = listing_item
         retsitz = (termin, [])
+        # first pass: scaffold every Sitzung of the day and collect its documents
+        scaffolds = []
         for sitzung_soup in sitzungen:
             time = sitzung_soup.find("div", class_="date").text.split(":")
 
@@ -126,7 +128,7 @@ class BYLTSitzungScraper(SitzungsScraper):
                 "experten": [] if "Anhörung" in title_line else None,
             }
             dok_span = sitzung_soup.find("span", class_="agenda-docs")
-            internal_docs = []
+            builders = []
             for link in dok_span.find_all("a"):
                 doc_link = unquote(link.get("href"))
                 tphint = "tops"
@@ -135,16 +137,28 @@ class BYLTSitzungScraper(SitzungsScraper):
                 parsed_url = urlparse(doc_link)
                 sitz_dict["nummer"] = int(parse_qs(parsed_url.query)["sitzungsnr"][0])
 
+                builders.append(
+                    ByTagesordnung(tphint, doc_link, self.session, self.config)
+                )
+            scaffolds.append((title_line, sitz_dict, builders))
+
+        # build the Tagesordnungen of all Sitzungen of the day at once, bounded
+        built = await build_documents(
+            [b for _, _, builders in scaffolds for b in builders],
+            self.max_documents_in_flight(),
+        )
+
+        # second pass: attach the documents in link order, not completion order
+        offset = 0
+        for title_line, sitz_dict, builders in scaffolds:
+            internal_docs = built[offset : offset + len(builders)]
+            offset += len(builders)
+            for dok in internal_docs:
                 ## general document parsing
-                dok = await ByTagesordnung(
-                    tphint, doc_link, self.session, self.config
-                ).build()
                 dokdic = dok.output.to_dict()
                 dokdic["zp_referenz"] = dokdic["zp_referenz"].isoformat()
                 dokdic["zp_modifiziert"] = dokdic["zp_modifiziert"].isoformat()
                 sitz_dict["dokumente"].append(dokdic)
-
-                internal_docs.append(dok)
             ## extract TOPS from the last TOPList
             if len(internal_docs) == 0:
                 logger.warning("Sitzung was found without available number or TOP File")
@@ -1,82 +1,354 @@
+import asyncio
+import io
+import json
 import os
 import re
+import shutil
 import subprocess
 import logging
+import tempfile
+import threading
 
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional, Tuple
 
 logger = logging.getLogger("collector")
 
+# the maximum number of tesseract processes running at once, across all documents
+OCR_CONCURRENCY = os.cpu_count() or 1
+# (event loop, semaphore) pair, see ocr_semaphore
+_ocr_semaphore = (None, None)
 
+# "tesserocr" keeps warm tesseract engines in threads, "cli" starts one tesseract
+# process per image, "auto" uses tesserocr if it is installed, see set_ocr_backend
+OCR_BACKEND = "auto"
+# the tesserocr module, None if it is not installed. Imported on first use, see load_tesserocr
+tesserocr = None
+_tesserocr_loaded = False
+# threads each holding one tesserocr engine, created on first use
+_engine_pool = None
+_engine = threading.local()
+
+# the disk space the pdfimages output of all documents may take up at once
+SCRATCH_QUOTA_BYTES = 1024**3
+# disk space reserved for the images of a pdf, relative to the size of the pdf
+SCRATCH_ESTIMATE_FACTOR = 4
+# (event loop, ScratchQuota) pair, see scratch_quota
+_scratch_quota = (None, None)
+
+# where a successful check_availability is remembered across restarts
+TOOLCHAIN_CACHE = Path.home() / ".cache" / "ltzf-collector" / "toolchain.json"
+# results of check_availability in this process, keyed by toolchain_fingerprint
+_availability = {}
+
+# where images were written to (and never removed) before scratch directories
+LEGACY_CACHE_DIR = Path("/tmp/ltzf-cache")
+
+
+# returns the global OCR semaphore of the running event loop.
+# Each cycle runs on a new loop and asyncio primitives are bound to theirs
+def ocr_semaphore() -> asyncio.Semaphore:
+    global _ocr_semaphore, OCR_CONCURRENCY
+    loop = asyncio.get_running_loop()
+    if _ocr_semaphore[0] is not loop:
+        _ocr_semaphore = (loop, asyncio.Semaphore(OCR_CONCURRENCY))
+    return _ocr_semaphore[1]
+
+
+class ScratchQuota:
+    """
+    Bounds the disk space used by the scratch directories of all documents.
+    A document waits until its reservation fits into the quota, a reservation
+    larger than the whole quota is only granted while no other one is held.
+    """
+
+    def __init__(self, quota: int):
+        self.quota = quota
+        self.used = 0
+        self.condition = asyncio.Condition()
+
+    # a scratch directory with `nbytes` of the quota, removed with all its contents on exit
+    @asynccontextmanager
+    async def scratch_dir(self, nbytes: int):
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.used == 0 or self.used + nbytes <= self.quota
+            )
+            self.used += nbytes
+        try:
+            with tempfile.TemporaryDirectory(prefix="ltzf-ocr-") as path:
+                yield Path(path)
+        finally:
+            async with self.condition:
+                self.used -= nbytes
+                self.condition.notify_all()
+
+
+# returns the global scratch quota of the running event loop, see ocr_semaphore
+def scratch_quota() -> ScratchQuota:
+    global _scratch_quota, SCRATCH_QUOTA_BYTES
+    loop = asyncio.get_running_loop()
+    if _scratch_quota[0] is not loop:
+        _scratch_quota = (loop, ScratchQuota(SCRATCH_QUOTA_BYTES))
+    return _scratch_quota[1]
+
+
+def load_tesserocr():
+    global tesserocr, _tesserocr_loaded
+    if not _tesserocr_loaded:
+        _tesserocr_loaded = True
+        try:
+            import tesserocr as module
+
+            tesserocr = module
+        except ImportError:
+            tesserocr = None
+    return tesserocr
+
+
+def set_ocr_backend(backend: str):
+    global OCR_BACKEND
+    if backend not in ("auto", "tesserocr", "cli"):
+        logger.warning(f"Unknown OCR backend `{backend}`, using auto instead")
+        backend = "auto"
+    if backend == "tesserocr" and load_tesserocr() is None:
+        logger.warning("OCR backend tesserocr is not installed, using the cli instead")
+    OCR_BACKEND = backend
+
+
+def use_engine() -> bool:
+    global OCR_BACKEND
+    return OCR_BACKEND != "cli" and load_tesserocr() is not None
+
+
+# the engine of the calling engine pool thread. Loading the deu traineddata
+# is what makes starting tesseract expensive, so each thread does it only once
+def thread_engine():
+    api = getattr(_engine, "api", None)
+    if api is None:
+        api = tesserocr.PyTessBaseAPI(lang="deu", psm=tesserocr.PSM.AUTO_OSD)
+        _engine.api = api
+    return api
+
+
+# tesseract -l deu --psm 1 on a warm engine, runs on the engine pool
+def engine_ocr(img: Path) -> str:
+    from PIL import Image
+
+    api = thread_engine()
+    with Image.open(img) as image:
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+
+async def run_engine(img: Path) -> str:
+    global _engine_pool, OCR_CONCURRENCY
+    if _engine_pool is None:
+        _engine_pool = ThreadPoolExecutor(
+            max_workers=OCR_CONCURRENCY, thread_name_prefix="tesserocr"
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_engine_pool, engine_ocr, img)
+
+
+# removes the images earlier versions left behind in LEGACY_CACHE_DIR
+def remove_legacy_cache():
+    global LEGACY_CACHE_DIR
+    if LEGACY_CACHE_DIR.exists():
+        logger.info(f"Removing leftover OCR images in {LEGACY_CACHE_DIR}")
+        shutil.rmtree(LEGACY_CACHE_DIR, ignore_errors=True)
+
+
+# runs a command without blocking the event loop, piping `input` into it.
+# Returns its exit code and output
+async def run_command(command: list, input: bytes = None) -> Tuple[int, bytes]:
+    logger.debug(f"Running {command}")
+    proc = await asyncio.create_subprocess_exec(
+        *[str(c) for c in command],
+        stdin=asyncio.subprocess.DEVNULL if input is None else asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # the pages are spread across the cores already, one thread per tesseract
+        env={**os.environ, "OMP_THREAD_LIMIT": "1"},
+    )
+    try:
+        outs, errs = await proc.communicate(input)
+    except asyncio.CancelledError:
+        # do not leave the process behind, e.g. when a sibling page failed
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        logger.error(f"{command[0]} failed: {errs.decode(errors='replace')}")
+    return proc.returncode, outs
+
+
+# the paths and modification times of the binaries check_availability checks,
+# or None if one of them is not installed
+def toolchain_fingerprint() -> Optional[list]:
+    fingerprint = []
+    for binary in ("tesseract", "pdfimages"):
+        path = shutil.which(binary)
+        if path is None:
+            logger.critical(f"Expected to find {binary}")
+            return None
+        path = os.path.realpath(path)
+        fingerprint.append([binary, path, os.stat(path).st_mtime_ns])
+    return fingerprint
+
+
+# Checks the toolchain once per process and binary version: the result is
+# memoized against toolchain_fingerprint and a successful check is also persisted
+# in TOOLCHAIN_CACHE, so neither a new cycle nor a restart runs it again
 def check_availability() -> bool:
+    global _availability
+    fingerprint = toolchain_fingerprint()
+    if fingerprint is None:
+        return False
+    key = json.dumps(fingerprint)
+    if key not in _availability:
+        if load_toolchain_check() == fingerprint:
+            logger.debug("Toolchain was checked before, skipping the check")
+            _availability[key] = True
+        else:
+            _availability[key] = run_availability_checks()
+            if _availability[key]:
+                store_toolchain_check(fingerprint)
+    return _availability[key]
+
+
+def load_toolchain_check() -> Optional[list]:
+    global TOOLCHAIN_CACHE
+    try:
+        with open(TOOLCHAIN_CACHE, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except Exception:
+        return None
+
+
+def store_toolchain_check(fingerprint: list):
+    global TOOLCHAIN_CACHE
+    try:
+        TOOLCHAIN_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        with open(TOOLCHAIN_CACHE, "w", encoding="utf-8") as file:
+            json.dump(fingerprint, file)
+    except Exception as e:
+        logger.debug(f"Unable to persist the toolchain check: {e}")
+
+
+def run_availability_checks() -> bool:
+    # all three checks run at once
+    procs = [
+        subprocess.Popen(
+            ["tesseract", "--version"], stdout=subprocess.PIPE, encoding="utf-8"
+        ),
+        subprocess.Popen(
+            ["tesseract", "--list-langs"], stdout=subprocess.PIPE, encoding="utf-8"
+        ),
+        subprocess.Popen(
+            ["pdfimages", "--version"], stderr=subprocess.PIPE, encoding="utf-8"
+        ),
+    ]
+    try:
+        results = [proc.communicate(timeout=5) for proc in procs]
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+    (version, _), (langs, _), (_, pdfimages_version) = results
+
     # check if tesseract with -l deu works
-    with subprocess.Popen(
-        ["tesseract", "--version"], stdout=subprocess.PIPE, encoding="utf-8"
-    ) as proc:
-        outs, errs = proc.communicate(timeout=5)
-        lines = outs.split("\n")
-        parts = lines[0].split(" ")
-        if parts[0] != "tesseract":
-            logger.critical("Expected to find Tesseract")
-            return False
-        version_parts = parts[1].split(".")
-        if version_parts[0] != "5":
-            logger.critical(f"Expected Tesseract version 5, got: {lines[0]}")
-            return False
+    lines = version.split("\n")
+    parts = lines[0].split(" ")
+    if parts[0] != "tesseract":
+        logger.critical("Expected to find Tesseract")
+        return False
+    version_parts = parts[1].split(".")
+    if version_parts[0] != "5":
+        logger.critical(f"Expected Tesseract version 5, got: {lines[0]}")
+        return False
 
-    with subprocess.Popen(
-        ["tesseract", "--list-langs"], stdout=subprocess.PIPE, encoding="utf-8"
-    ) as proc:
-        outs, errs = proc.communicate(timeout=5)
-        lines = outs.split("\n")
-        if "deu" not in lines:
-            logger.critical("Expected to find german language for tesseract")
-            return False
+    lines = langs.split("\n")
+    if "deu" not in lines:
+        logger.critical("Expected to find german language for tesseract")
+        return False
 
     # check if pdfimages works
-    with subprocess.Popen(
-        ["pdfimages", "--version"], stderr=subprocess.PIPE, encoding="utf-8"
-    ) as proc:
-        o, e = proc.communicate(timeout=5)
-        lines = e.split("\n")
-        vnum = lines[0].split(" ")[2]
-        v_maj = int(vnum.split(".")[0])
-
-        if v_maj < 20:
-            logger.critical(
-                f"Expected to find pdfimages version 20 or higher in line {lines[0]}"
-            )
-            return False
+    lines = pdfimages_version.split("\n")
+    vnum = lines[0].split(" ")[2]
+    v_maj = int(vnum.split(".")[0])
+
+    if v_maj < 20:
+        logger.critical(
+            f"Expected to find pdfimages version 20 or higher in line {lines[0]}"
+        )
+        return False
     return True
 
 
-def extract_ocr_text(pdf_path: Path) -> str:
-    img_p = sanitize_images(pdf_to_img(pdf_path))
-    txts = filter_useful_str(img_to_txt(img_p))
-    return "".join(txts)
+# OCRs the whole pdf, or only the given (1-based) page of it.
+# For reserve see pdf_to_img
+async def extract_ocr_text(
+    pdf_path: Path, page: int = None, reserve: int = None
+) -> str:
+    async with pdf_to_img(pdf_path, page, reserve) as images:
+        img_p = sanitize_images(images)
+        if img_p is None:
+            raise Exception(f"OCR failed: no images extracted from {pdf_path}")
+        txts = await img_to_txt(img_p)
+    if txts is None:
+        raise Exception(f"OCR failed on {pdf_path}")
+    return "".join(filter_useful_str(txts))
 
 
-# run pdfimages -png pdf_path /tmp/images/img_base_path
-def pdf_to_img(pdf_path: Path) -> list[Path]:
-    parent = Path(f"/tmp/ltzf-cache/{pdf_path.name}.d")
-    parent.absolute().mkdir(parents=True, exist_ok=True)
+# OCRs the given (1-based) pages of the pdf concurrently,
+# returns their texts in the order of `pages`, None for the pages OCR failed on.
+# The pages share the scratch space estimated for the whole pdf
+async def extract_ocr_pages(pdf_path: Path, pages: list[int]) -> list[Optional[str]]:
+    global SCRATCH_ESTIMATE_FACTOR
+    reserve = pdf_path.stat().st_size * SCRATCH_ESTIMATE_FACTOR // max(1, len(pages))
+    texts = await asyncio.gather(
+        *[extract_ocr_text(pdf_path, page, reserve) for page in pages],
+        return_exceptions=True,
+    )
+    for i, (page, text) in enumerate(zip(pages, texts)):
+        if isinstance(text, Exception):
+            logger.warning(f"OCR of page {page} of {pdf_path} failed: {text}")
+            texts[i] = None
+    return texts
 
-    command = ["pdfimages", "-png", pdf_path.absolute(), str(parent / "img")]
-    logger.debug(f"Running {command}")
-    p = subprocess.run(command)
-    if p.returncode != 0:
-        logger.error("Error: Extracting images failed")
-        return None
-    # filter images based on a oom-scheme
-    # the largest image and everything above max / 10
-    max_sz = 0
-    files = []
-    for f in parent.iterdir():
-        if f.is_file() and f.suffix == ".png":
-            max_sz = max(max_sz, f.stat().st_size)
-            files.append(f)
-    return [f for f in files if f.stat().st_size >= max_sz / 10]
+
+# run pdfimages -png [-f page -l page] pdf_path scratch_dir/img
+# and yield the png files in order, None if that failed. pdfimages can only write
+# files, so they go to a scratch directory (see ScratchQuota) that is kept until the
+# context is left: the images are OCR'd straight from there, not from memory.
+# reserve is the part of the quota taken, by default an estimate for the whole pdf
+@asynccontextmanager
+async def pdf_to_img(pdf_path: Path, page: int = None, reserve: int = None):
+    global SCRATCH_ESTIMATE_FACTOR
+    if reserve is None:
+        reserve = pdf_path.stat().st_size * SCRATCH_ESTIMATE_FACTOR
+    async with scratch_quota().scratch_dir(reserve) as parent:
+        command = ["pdfimages", "-png"]
+        if page is not None:
+            command += ["-f", page, "-l", page]
+        command += [pdf_path.absolute(), str(parent / "img")]
+        returncode, _ = await run_command(command)
+        if returncode != 0:
+            logger.error("Error: Extracting images failed")
+            yield None
+            return
+        files = sorted(
+            f for f in parent.iterdir() if f.is_file() and f.suffix == ".png"
+        )
+        # filter images based on a oom-scheme
+        # the largest image and everything above max / 10
+        sizes = [f.stat().st_size for f in files]
+        max_sz = max(sizes, default=0)
+        yield [f for f, size in zip(files, sizes) if size >= max_sz / 10]
 
 
 # run tesseract command with the image it is given.
@@ -104,25 +376,48 @@ def determine_rotation(image: Path) -> int:
 
 
 def sanitize_images(images: list[Path]) -> list[Path]:
-    #    for imgp in images:
+    #    for i, img in enumerate(images):
     #        # let tesseract guess the best rotation
-    #        determine_rotation(imgp)
+    #        determine_rotation(img)
     #        # then rotate according to that
-    #        img = Image.open(imgp.absolute())
-    #        img.rotate(360 - rot_deg).save(imgp.absolute())
+    #        rotated = io.BytesIO()
+    #        Image.open(io.BytesIO(img)).rotate(360 - rot_deg).save(rotated, "PNG")
+    #        images[i] = rotated.getvalue()
     return images
 
 
-def img_to_txt(images: list[Path]) -> list[str]:
-    # run tesseract -l deu images[i] images[i].txt
-    strings = []
-    for img in sorted(images):
-        p = subprocess.run(["tesseract", "-l", "deu", "--psm", "1", img, img])
-        if p.returncode != 0:
-            logger.error("Error extracting {img}")
+# run tesseract -l deu images[i] stdout and read the text back,
+# or use a warm tesserocr engine instead (see OCR_BACKEND),
+# on all pages at once, bounded by the global OCR semaphore. An image is only
+# loaded by whatever OCRs it, so at most OCR_CONCURRENCY of them are in memory.
+# The output is in page order, regardless of which page finished first
+async def img_to_txt(images: list[Path]) -> list[str]:
+    async def ocr_page(index: int, img: Path) -> str:
+        async with ocr_semaphore():
+            if use_engine():
+                try:
+                    return await run_engine(img)
+                except Exception as e:
+                    logger.warning(
+                        f"tesserocr failed on image {index}, falling back to the cli: {e}"
+                    )
+            returncode, text = await run_command(
+                ["tesseract", "-l", "deu", "--psm", "1", img.absolute(), "stdout"]
+            )
+        if returncode != 0:
+            logger.error(f"Error extracting image {index}")
+            return None
+        return text.decode("utf-8")
+
+    strings = await asyncio.gather(
+        *[ocr_page(i, img) for i, img in enumerate(images)], return_exceptions=True
+    )
+    for page in strings:
+        if isinstance(page, Exception):
+            logger.error(f"Error reading OCR output: {page}")
+            return None
+        if page is None:
             return None
-        with open(str(img) + ".txt", "r", encoding="utf-8") as file:
-            strings.append(file.read())
     return strings
 
 
@@ -138,4 +433,6 @@ def filter_useful_str(strings: list[str]) -> list[str]:
 if __name__ == "__main__":
     print(check_availability())
     #    print(extract_ocr_text(Path("/home/crystalkey/Downloads/0000000041.pdf")))
-    print(extract_ocr_text(Path("/home/crystalkey/Downloads/0000000003.pdf")))
+    print(
+        asyncio.run(extract_ocr_text(Path("/home/crystalkey/Downloads/0000000003.pdf")))
+    )
@@ -0,0 +1,79 @@
+# Compares the cache backends of collector.cache_backend with the Vorgang fixtures
+# in collector/tests/bylt_scraper as values:
+#   python -m collector.tests.bench_cache_backend [--redis localhost:6379] [-n 200]
+# Writes n keys one by one and batched, then reads them one by one and batched.
+# The keys are written under a prefix of their own and removed again from sqlite
+# (a temporary file); Redis keys expire after a minute.
+# Redis is skipped if it is not reachable
+import asyncio
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from uuid import uuid4
+
+from collector.cache_backend import RedisBackend, SqliteBackend
+from collector.scrapercache import ScraperCache
+from collector.tests.bench_cache_compression import FIXTURES, load_values
+
+
+async def bench(name: str, cache: ScraperCache, values: list[str], n: int):
+    prefix = f"vg:bench-{uuid4().hex}:"
+    items = {f"{prefix}{i}": values[i % len(values)] for i in range(n)}
+    keys = list(items)
+
+    async def timed(what, f):
+        start = time.perf_counter()
+        await f()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>7}: {what:<12} {elapsed * 1000:>9.1f}ms, {elapsed / n * 1e6:>8.1f}µs/key"
+        )
+
+    async def store_each():
+        for key, value in items.items():
+            await cache.store_raw(key, value, expiry=1)
+
+    async def get_each():
+        for key in keys:
+            assert await cache.get_raw(key) is not None
+
+    async def get_many():
+        assert None not in await cache.get_many(keys)
+
+    try:
+        await timed("store_raw", store_each)
+        await timed("store_many", lambda: cache.store_many(items, expiry=1))
+        await timed("get_raw", get_each)
+        await timed("get_many", get_many)
+    finally:
+        await cache.close()
+
+
+def main():
+    parser = ArgumentParser(
+        prog="bench_cache_backend", description="Compares Redis and SQLite as cache"
+    )
+    parser.add_argument("--redis", default="localhost:6379", help="host:port")
+    parser.add_argument("-n", type=int, default=200, help="keys written and read")
+    args = parser.parse_args()
+
+    values = load_values(sorted(FIXTURES.glob("vorgang_*.json")))
+    print(f"{args.n} keys, values taken from {len(values)} fixtures, compressed")
+    with tempfile.TemporaryDirectory(prefix="ltzf-bench-") as tmp:
+        sqlite = ScraperCache(None, None, backend=SqliteBackend(Path(tmp) / "c.sqlite"))
+        asyncio.run(bench("sqlite", sqlite, values, args.n))
+
+    host, port = args.redis.rsplit(":", 1)
+    try:
+        backend = RedisBackend(host, int(port))
+    except Exception as e:
+        print(f"Redis at {args.redis} is not reachable, skipping it: {e}")
+        return
+    asyncio.run(
+        bench("redis", ScraperCache(None, None, backend=backend), values, args.n)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Compares the cache value codecs of collector.scrapercache on the Vorgang fixtures
+# in collector/tests/bylt_scraper (or the json files given):
+#   python -m collector.tests.bench_cache_compression [vorgang.json ...]
+# Prints the stored size and the time to encode and decode every value per codec.
+# zstd is skipped if neither compression.zstd nor zstandard is available
+import json
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from collector import scrapercache
+
+FIXTURES = Path(__file__).parent / "bylt_scraper"
+ROUNDS = 20
+
+
+# the values as they would be stored under vg: keys
+def load_values(paths: list[Path]) -> list[str]:
+    values = []
+    for path in paths:
+        with path.open(encoding="utf-8") as f:
+            fixture = json.load(f)
+        if isinstance(fixture, dict) and "result" in fixture:
+            fixture = fixture["result"]
+        values.append(json.dumps(fixture))
+    return values
+
+
+def bench(codec, values: list[str]):
+    plain = sum(len(v.encode("utf-8")) for v in values)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        encoded = [scrapercache.encode_value(v, codec) for v in values]
+    encode_s = (time.perf_counter() - start) / ROUNDS
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        decoded = [scrapercache.decode_value(e) for e in encoded]
+    decode_s = (time.perf_counter() - start) / ROUNDS
+    assert decoded == values
+    stored = sum(len(e) for e in encoded)
+    print(
+        f"{codec or 'none':>5}: {stored / 1024:>9.1f} KiB ({stored / plain:>6.1%}), "
+        f"encode {encode_s * 1000:>7.2f}ms, decode {decode_s * 1000:>7.2f}ms"
+    )
+
+
+def main():
+    parser = ArgumentParser(
+        prog="bench_cache_compression",
+        description="Compares the codecs for cached documents and Vorgänge",
+    )
+    parser.add_argument("fixtures", nargs="*", type=Path)
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(FIXTURES.glob("vorgang_*.json"))
+    values = load_values(paths)
+    print(f"{len(values)} values, mean of {ROUNDS} rounds over all of them")
+    bench(None, values)
+    bench("zlib", values)
+    if scrapercache.load_zstd() is None:
+        print("zstd is not available, skipping it")
+        return
+    bench("zstd", values)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Measures what a document cache hit costs: turning the cached json back into a
+# BayernDokument. The documents are those of the Vorgang fixtures in
+# collector/tests/bylt_scraper, wrapped the way ScraperCache.store_dokument stores them:
+#   python -m collector.tests.bench_hydration [-n 200]
+import json
+import time
+from argparse import ArgumentParser
+
+from openapi_client import models
+
+from collector.config import CollectorConfiguration
+from collector.convert import hydrate_model
+from collector.scrapers.by_dok import ByGesetzentwurf
+from collector.tests.bench_cache_compression import FIXTURES
+
+
+# the cached json of every document in the fixtures
+def load_documents() -> list[str]:
+    documents = []
+    for path in sorted(FIXTURES.glob("vorgang_*.json")):
+        with path.open(encoding="utf-8") as f:
+            vorgang = json.load(f)["result"]
+        for station in vorgang["stationen"]:
+            for dokument in station.get("dokumente") or []:
+                if not isinstance(dokument, dict):
+                    continue
+                documents.append(
+                    json.dumps(
+                        {
+                            "output": dokument,
+                            "local_path": None,
+                            "trojanergefahr": None,
+                            "tops": None,
+                            "typehint": dokument["typ"],
+                            "url": dokument["link"],
+                        }
+                    )
+                )
+    return documents
+
+
+def bench(what: str, f, documents: list[str], rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for raw in documents:
+            f(raw)
+    elapsed = (time.perf_counter() - start) / (rounds * len(documents))
+    print(f"{what:<40} {elapsed * 1e6:>9.1f}µs/document")
+
+
+def main():
+    parser = ArgumentParser(
+        prog="bench_hydration", description="Cost of hydrating a cached document"
+    )
+    parser.add_argument("-n", type=int, default=200, help="rounds over all documents")
+    args = parser.parse_args()
+
+    documents = load_documents()
+    print(f"{len(documents)} documents, {args.n} rounds")
+    # stands in for the configuration of the running collector
+    config = CollectorConfiguration()
+    outputs = [json.loads(raw)["output"] for raw in documents]
+
+    bench(
+        "from_json, new configuration",
+        lambda raw: ByGesetzentwurf.from_json(raw),
+        documents,
+        args.n,
+    )
+    bench(
+        "from_json, caller's configuration",
+        lambda raw: ByGesetzentwurf.from_json(raw, config),
+        documents,
+        args.n,
+    )
+    outputs = iter(outputs * args.n)
+    bench(
+        "models.Dokument.from_dict",
+        lambda raw: models.Dokument.from_dict(next(outputs)),
+        documents,
+        args.n,
+    )
+    outputs = iter([json.loads(raw)["output"] for raw in documents] * args.n)
+    bench(
+        "hydrate_model(models.Dokument)",
+        lambda raw: hydrate_model(models.Dokument, next(outputs)),
+        documents,
+        args.n,
+    )
+
+
+if __name__ == "__main__":
+    main()
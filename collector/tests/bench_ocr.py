@@ -0,0 +1,44 @@
+# Compares the OCR backends of collector.tesseract_wrapper on scanned pdfs:
+#   python -m collector.tests.bench_ocr scan1.pdf scan2.pdf ...
+# Every pdf is OCR'd as a whole, one after the other, once per backend.
+# The tesserocr backend is skipped if tesserocr is not installed
+import asyncio
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from collector import tesseract_wrapper
+
+
+async def bench(backend: str, pdfs: list[Path]):
+    tesseract_wrapper.set_ocr_backend(backend)
+    chars = 0
+    start = time.perf_counter()
+    for pdf in pdfs:
+        doc_start = time.perf_counter()
+        text = await tesseract_wrapper.extract_ocr_text(pdf)
+        chars += len(text)
+        print(
+            f"{backend:>9}: {pdf.name}: {time.perf_counter() - doc_start:.2f}s, {len(text)} chars"
+        )
+    print(
+        f"{backend:>9}: total {time.perf_counter() - start:.2f}s for {len(pdfs)} pdfs, {chars} chars"
+    )
+
+
+async def main():
+    parser = ArgumentParser(
+        prog="bench_ocr", description="Compares the OCR backends on scanned pdfs"
+    )
+    parser.add_argument("pdfs", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    await bench("cli", args.pdfs)
+    if tesseract_wrapper.load_tesserocr() is None:
+        print("tesserocr is not installed, skipping it")
+        return
+    await bench("tesserocr", args.pdfs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,9 @@
 import asyncio
 import jsondiff
 from unittest.mock import Mock
+from collector.scrapers import bylt_scraper
 from collector.scrapers.bylt_scraper import BYLTScraper
+from collector.scrapercache import ScraperCache
 from collector.convert import sanitize_for_serialization
 from collector.config import CollectorConfiguration
 from oapicode.openapi_client import Configuration
@@ -12,6 +14,7 @@ import aiohttp
 import pytest
 from oapicode.openapi_client import models
 from bs4 import BeautifulSoup
+from uuid import uuid4
 
 SCRAPER_NAME = "bylt_scraper"
 
@@ -161,6 +164,172 @@ async def test_soup_to_item():
                     ), f"Scenario {i+1}/{len(cases_html)}: {cases_html[i]}\n{"".join(ostat)}\n{"".join(sstat)}"
 
 
+# stands in for the document builds, one document per builder
+async def fake_build_documents(builders, max_in_flight, optional=()):
+    data_dir = os.path.join(os.path.dirname(__file__), SCRAPER_NAME)
+    with open(os.path.join(data_dir, "vorgang_ablehnung_2025-11-08.json")) as f:
+        template = json.load(f)["result"]["stationen"][0]["dokumente"][0]
+
+    class FakeDocument:
+        def __init__(self, url):
+            self.output = models.Dokument.from_dict(
+                {**template, "link": url, "api_id": str(uuid4())}
+            )
+            self.trojanergefahr = 1
+
+    return [FakeDocument(builder.url) for builder in builders]
+
+
+def station_summary(vg: models.Vorgang) -> list:
+    return [
+        (s.typ, len(s.dokumente), len(s.stellungnahmen or [])) for s in vg.stationen
+    ]
+
+
+# the Vorgang fixtures as (html without its last row, full html)
+def incremental_cases():
+    data_dir = os.path.join(os.path.dirname(__file__), SCRAPER_NAME)
+    for case in sorted(glob.glob(os.path.join(data_dir, "vorgang_*.htmltest"))):
+        with open(case, "r") as hf:
+            html = hf.read()
+        soup = BeautifulSoup(html, features="html.parser")
+        rows = soup.find("tbody", id="vorgangsanzeigedokumente_data").find_all("tr")
+        rows[-1].decompose()
+        yield case, str(soup), html
+
+
+def soup(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, features="html.parser")
+
+
+# a Vorgang extracted from a page that lacks its last rows is updated in place
+# once they appear, and ends up like the one extracted from the full page
+@pytest.mark.asyncio
+async def test_soup_to_item_incremental(monkeypatch):
+    monkeypatch.setattr(bylt_scraper, "check_availability", lambda: True)
+    monkeypatch.setattr(bylt_scraper, "build_documents", fake_build_documents)
+    async with aiohttp.ClientSession() as session:
+        scraper = create_scraper(session)
+        scraper.item_count = 100
+
+        for case, old_html, html in incremental_cases():
+            url = f"https://example.org/{uuid4()}"
+            full = await scraper.soup_to_item(f"{url}/full", soup(html))
+            old = await scraper.soup_to_item(url, soup(old_html))
+            await scraper.store_extracted_result(url, old)
+
+            updated = await scraper.soup_to_item(url, soup(html))
+            assert updated.api_id == old.api_id, case
+            assert station_summary(updated) == station_summary(full), case
+
+
+# an update that could not be sent is stored with the fingerprint of the rows it
+# was extracted from once the outbox is drained, so the next cycle finds nothing new
+@pytest.mark.asyncio
+async def test_incremental_outbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(bylt_scraper, "check_availability", lambda: True)
+    monkeypatch.setattr(bylt_scraper, "build_documents", fake_build_documents)
+    async with aiohttp.ClientSession() as session:
+        scraper = create_scraper(session)
+        scraper.config.outbox_path = str(tmp_path / "outbox.sqlite")
+        scraper.item_count = 100
+
+        for case, old_html, html in incremental_cases():
+            url = f"https://example.org/{uuid4()}"
+            old = await scraper.soup_to_item(url, soup(old_html))
+            await scraper.store_extracted_result(url, old)
+            # the update fails to send
+            updated = await scraper.soup_to_item(url, soup(html))
+            await scraper.defer_result(url, updated)
+
+            # next cycle: a new instance drains the outbox
+            next_cycle = create_scraper(session)
+            next_cycle.config.outbox_path = scraper.config.outbox_path
+            next_cycle.item_count = 100
+
+            async def send_result(item):
+                return item
+
+            next_cycle.send_result = send_result
+            [(sent, key)] = await next_cycle.drain_outbox()
+            assert key == url and sent.api_id == old.api_id, case
+            assert station_summary(sent) == station_summary(updated), case
+            stored = await next_cycle.config.cache.get_vorgang_fingerprints([url])
+            assert stored == [await next_cycle.page_fingerprint(html)], case
+
+            again = await next_cycle.soup_to_item(url, soup(html))
+            assert again.api_id == old.api_id, case
+            assert station_summary(again) == station_summary(updated), case
+
+
+# cached Vorgänge are stale once their rows changed. One cached without a
+# fingerprint is stale too, rows may have been added since
+@pytest.mark.asyncio
+async def test_stale_keys(monkeypatch):
+    monkeypatch.setattr(bylt_scraper, "check_availability", lambda: True)
+    monkeypatch.setattr(bylt_scraper, "build_documents", fake_build_documents)
+    async with aiohttp.ClientSession() as session:
+        scraper = create_scraper(session)
+        scraper.item_count = 100
+        case, old_html, html = next(incremental_cases())
+        pages = {}
+
+        async def fetch_parsed(url, parse):
+            return await parse(pages[url])
+
+        scraper.fetch_parsed = fetch_parsed
+        urls = [f"https://example.org/{uuid4()}" for _ in range(3)]
+        unchanged, changed, legacy = urls
+        for url in urls:
+            pages[url] = old_html
+            vg = await scraper.soup_to_item(url, soup(old_html))
+            if url == legacy:
+                await scraper.config.cache.store_vorgang(url, vg)
+            else:
+                await scraper.store_extracted_result(url, vg)
+        pages[changed] = html
+
+        assert await scraper.get_stale_keys(urls, urls) == {changed, legacy}
+
+
+# a Vorgang extracted again after its cached copy expired keeps its api_id. So
+# does one cached before the api_id was stored apart, once it was checked
+@pytest.mark.asyncio
+async def test_expired_vorgang(monkeypatch):
+    monkeypatch.setattr(bylt_scraper, "check_availability", lambda: True)
+    monkeypatch.setattr(bylt_scraper, "build_documents", fake_build_documents)
+    async with aiohttp.ClientSession() as session:
+        scraper = create_scraper(session)
+        scraper.item_count = 100
+        cache = scraper.config.cache
+        case, old_html, html = next(incremental_cases())
+
+        async def fetch_parsed(url, parse):
+            return await parse(old_html)
+
+        scraper.fetch_parsed = fetch_parsed
+
+        url = f"https://example.org/{uuid4()}"
+        vg = await scraper.soup_to_item(url, soup(old_html))
+        await scraper.store_extracted_result(url, vg)
+        await cache.backend.client().delete(f"vg:{url}", f"vgfp:{url}")
+        cache.local.clear()
+        assert await cache.has_vorgaenge([url]) == [False]
+        again = await scraper.soup_to_item(url, soup(html))
+        assert again.api_id == vg.api_id
+
+        legacy = f"https://example.org/{uuid4()}"
+        await cache.store_raw(
+            f"vg:{legacy}", json.dumps(sanitize_for_serialization(vg))
+        )
+        await cache.store_raw(
+            f"vgfp:{legacy}", await scraper.page_fingerprint(old_html)
+        )
+        assert await cache.get_vorgang_api_ids([legacy]) == [None]
+        assert await scraper.get_stale_keys([legacy], [legacy]) == set()
+        assert await cache.get_vorgang_api_ids([legacy]) == [str(vg.api_id)]
+
+
 @pytest.mark.asyncio
 async def test_canary_item():
     # TODO: Only "online" version of item test that checks if the format
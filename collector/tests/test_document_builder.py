@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+
+from collector.config import CollectorConfiguration
+from collector.document_builder import build_documents
+
+
+class FakeBuilder:
+    def __init__(self, config, url, delay, fail=False):
+        self.config = config
+        self.url = url
+        self.delay = delay
+        self.fail = fail
+        self.state = "pending"
+
+    def hydrate(self, jstr):
+        return None
+
+    async def build(self, prefetched=False, cached=None):
+        self.state = "building"
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        if self.fail:
+            self.state = "failed"
+            raise RuntimeError(f"{self.url} failed")
+        self.state = "built"
+        return self
+
+
+@pytest.mark.asyncio
+async def test_build_documents():
+    config = CollectorConfiguration()
+    config.load_only_env()
+    builders = [
+        FakeBuilder(config, "slow", 0.02),
+        FakeBuilder(config, "stln", 0.001, fail=True),
+        FakeBuilder(config, "fast", 0.001),
+    ]
+    # optional builders may fail on their own, the output is in input order
+    built = await build_documents(builders, 2, optional=[builders[1]])
+    assert built[0] is builders[0] and built[2] is builders[2]
+    assert isinstance(built[1], RuntimeError)
+
+    # any other failure cancels the builds still running or waiting
+    builders = [
+        FakeBuilder(config, "entwurf", 0.001, fail=True),
+        FakeBuilder(config, "slow", 10),
+        FakeBuilder(config, "waiting", 10),
+    ]
+    with pytest.raises(RuntimeError, match="entwurf failed"):
+        await asyncio.wait_for(build_documents(builders, 2), 5)
+    assert builders[1].state == "cancelled"
+    assert builders[2].state in ("pending", "cancelled")
@@ -0,0 +1,52 @@
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+# heavy dependencies only imported on first use, never for the entry point itself
+HEAVY_MODULES = [
+    "aiohttp",
+    "jsonschema",
+    "kreuzberg",
+    "litellm",
+    "openapi_client",
+    "PIL",
+    "pypdf",
+    "redis",
+    "tesserocr",
+]
+# generous upper bound on the time `python -m collector --dump-config` spends
+# importing, loading the dependencies above alone takes seconds
+IMPORT_BUDGET_US = 1_000_000
+
+
+def test_importtime():
+    env = {
+        **os.environ,
+        "LTZF_API_KEY": "importtime",
+        "OPENAI_API_KEY": "importtime",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "collector", "--dump-config"],
+        cwd=Path(__file__).parents[2],
+        env=env,
+        capture_output=True,
+        encoding="utf-8",
+        timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
+
+    imported = {}
+    total_us = 0
+    # import time: self [us] | cumulative | imported package
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imported[name.strip()] = int(cumulative)
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+
+    loaded = [m for m in imported if m.split(".")[0] in HEAVY_MODULES]
+    assert loaded == [], f"Imported at startup: {loaded}"
+    assert total_us < IMPORT_BUDGET_US, f"Imports took {total_us}us"
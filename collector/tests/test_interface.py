@@ -1,14 +1,59 @@
-from collector.interface import Scraper, VorgangsScraper, SitzungsScraper
+from collector.interface import (
+    ItemRejected,
+    Scraper,
+    VorgangsScraper,
+    SitzungsScraper,
+)
 from collector.config import CollectorConfiguration, Configuration
 from oapicode.openapi_client import models
 import os
 import datetime
 import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 import asyncio
 import pytest
 from uuid import uuid4
 
 
+def make_mock_vorgang() -> models.Vorgang:
+    return models.Vorgang.from_dict(
+        {
+            "api_id": str(uuid4()),
+            "titel": "TestTitel",
+            "kurztitel": "Kurztesttitel",
+            "wahlperiode": 27,
+            "verfassungsaendernd": False,
+            "typ": "gg-land-volk",
+            "ids": [models.VgIdent.from_dict({"typ": "initdrucks", "id": "27/512"})],
+            "initiatoren": [
+                models.Autor.from_dict(
+                    {"person": "Peter Zwegat", "organisation": "Die Linke"}
+                )
+            ],
+            "stationen": [
+                models.Station.from_dict(
+                    {
+                        "titel": "Testtitelstation",
+                        "zp_start": datetime.datetime.now().astimezone(datetime.UTC),
+                        "zp_modifiziert": datetime.datetime.now().astimezone(
+                            datetime.UTC
+                        ),
+                        "gremium": {
+                            "parlament": "BB",
+                            "name": "plenum",
+                            "wahlperiode": 19,
+                        },
+                        "typ": "preparl-regent",
+                        "trojanergefahr": 4,
+                        "dokumente": [],
+                    }
+                )
+            ],
+        }
+    )
+
+
 class MockSitzungsScraper(SitzungsScraper):
     async def listing_page_extractor(self, url):
         return []
@@ -88,6 +133,382 @@ async def test_process_items():
         )
 
 
+@pytest.mark.asyncio
+async def test_cached_keys():
+    config = CollectorConfiguration()
+    config.load_only_env()
+
+    config.oapiconfig = Configuration(host="http://localhost")
+    async with aiohttp.ClientSession() as session:
+        scraper = MockVorgangsScraper(config, uuid4(), [], session)
+        stored, missing = str(uuid4()), str(uuid4())
+        assert await config.cache.store_vorgang(stored, make_mock_vorgang())
+        assert await scraper.get_cached_keys([stored, missing]) == {stored}
+
+        # the default falls back to get_cached_result
+        scraper = MockBaseScraperSuccess(config, uuid4(), [], session)
+        assert await scraper.get_cached_keys([stored, missing]) == set()
+
+
+@pytest.mark.asyncio
+async def test_conditional_fetch():
+    config = CollectorConfiguration()
+    config.load_only_env()
+
+    config.oapiconfig = Configuration(host="http://localhost")
+    page = {"body": "<p>first</p>", "etag": '"1"'}
+    conditional = []
+
+    async def handler(request):
+        conditional.append(request.headers.get("If-None-Match"))
+        if page["etag"] and request.headers.get("If-None-Match") == page["etag"]:
+            return web.Response(status=304)
+        headers = {"ETag": page["etag"]} if page["etag"] else {}
+        return web.Response(text=page["body"], headers=headers)
+
+    parsed = []
+
+    async def parse(text):
+        parsed.append(text)
+        return [text]
+
+    stored = []
+    store_html = config.cache.store_html
+
+    async def count_store_html(key, value, **kwargs):
+        stored.append(key)
+        return await store_html(key, value, **kwargs)
+
+    config.cache.store_html = count_store_html
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        scraper = MockBaseScraperSuccess(config, uuid4(), [], session)
+        url = str(server.make_url(f"/{uuid4()}"))
+        assert await scraper.fetch_parsed(url, parse) == ["<p>first</p>"]
+        # page and parse result are written at once
+        assert stored == [url]
+        # unchanged: the server answers 304 and the page is not parsed again
+        assert await scraper.fetch_parsed(url, parse) == ["<p>first</p>"]
+        assert await scraper.fetch_text(url) == "<p>first</p>"
+        assert conditional == [None, '"1"', '"1"']
+        assert parsed == ["<p>first</p>"]
+        # but written again, so it does not expire while in use
+        assert stored == [url] * 3
+        assert (await config.cache.get_html_entry(url))["parsed"] == ["<p>first</p>"]
+
+        page.update(body="<p>second</p>", etag='"2"')
+        assert await scraper.fetch_parsed(url, parse) == ["<p>second</p>"]
+        assert parsed == ["<p>first</p>", "<p>second</p>"]
+
+        # without validators the body's hash tells that nothing changed
+        page.update(etag=None)
+        other = str(server.make_url(f"/{uuid4()}"))
+        assert await scraper.fetch_parsed(other, parse) == ["<p>second</p>"]
+        assert await scraper.fetch_parsed(other, parse) == ["<p>second</p>"]
+        assert len(parsed) == 3
+
+
+class MockVorgangsScraperStale(MockVorgangsScraper):
+    stale = set()
+
+    async def get_stale_keys(self, items, item_keys):
+        return {key for key in item_keys if key in self.stale}
+
+    async def item_extractor(self, listing_item):
+        return make_mock_vorgang()
+
+    async def send_result(self, item):
+        return item
+
+
+@pytest.mark.asyncio
+async def test_stale_keys():
+    config = CollectorConfiguration()
+    config.load_only_env()
+
+    config.oapiconfig = Configuration(host="http://localhost")
+    async with aiohttp.ClientSession() as session:
+        scraper = MockVorgangsScraperStale(config, uuid4(), [], session)
+        current, changed, new = str(uuid4()), str(uuid4()), str(uuid4())
+        for key in [current, changed]:
+            assert await config.cache.store_vorgang(key, make_mock_vorgang())
+        scraper.stale = {changed}
+        assert await scraper.get_current_keys(
+            [current, changed, new], [current, changed, new]
+        ) == {current}
+
+        # only the changed and the new item are extracted again
+        results = await scraper.process_items([current, changed, new])
+        assert sorted(item for _, item in results) == sorted([changed, new])
+
+
+@pytest.mark.asyncio
+async def test_sitzung_cache_key():
+    config = CollectorConfiguration()
+    config.load_only_env()
+
+    config.oapiconfig = Configuration(host="http://localhost")
+    async with aiohttp.ClientSession() as session:
+        scraper = MockSitzungsScraper(config, uuid4(), [], session)
+        day = datetime.date(2025, 11, 6)
+        key = await scraper.make_cache_key((day, frozenset(["<a/>", "<b/>"])))
+        assert key.startswith("sz:") and len(key) == len("sz:") + 64
+        assert key == await scraper.make_cache_key((day, frozenset(["<b/>", "<a/>"])))
+        assert key != await scraper.make_cache_key((day, frozenset(["<a/>"])))
+
+
+class MockBaseScraperTracking(MockBaseScraperSuccess):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.max_seen = 0
+
+    async def item_extractor(self, listing_item):
+        self.in_flight += 1
+        self.max_seen = max(self.max_seen, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if listing_item == "raise":
+            raise Exception("extraction failed")
+        return f"processed:{listing_item}"
+
+
+@pytest.mark.asyncio
+async def test_process_items_bounded():
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.oapiconfig = Configuration(host="http://localhost")
+    config.max_items_in_flight = 2
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=1)
+    ) as session:
+        scraper = MockBaseScraperTracking(config, uuid4(), [], session)
+        items = [f"item{i}" for i in range(7)] + ["raise"]
+        results = await scraper.process_items(items)
+        assert scraper.max_seen == 2
+        assert len(results) == len(items)
+        assert isinstance(results[-1], Exception)
+        assert results[:-1] == [(f"processed:{i}", i) for i in sorted(items)[:-1]]
+
+        config.linearize = True
+        scraper = MockBaseScraperTracking(config, uuid4(), [], session)
+        await scraper.process_items(items)
+        assert scraper.max_seen == 1
+
+
+class MockBaseScraperStreaming(MockBaseScraperSuccess):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_item_done = asyncio.Event()
+        self.extracted = []
+
+    async def listing_page_extractor(self, url):
+        if url == "slow":
+            # only finishes once an item of the other listing page went through
+            await asyncio.wait_for(self.first_item_done.wait(), timeout=5)
+            return ["item2", "item3"]
+        return ["item1", "item2"]
+
+    async def item_extractor(self, listing_item):
+        self.extracted.append(listing_item)
+        self.first_item_done.set()
+        return f"processed:{listing_item}"
+
+
+@pytest.mark.asyncio
+async def test_process_pipeline():
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.oapiconfig = Configuration(host="http://localhost")
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=1)
+    ) as session:
+        scraper = MockBaseScraperStreaming(config, uuid4(), ["slow", "fast"], session)
+        results = await scraper.process_pipeline(scraper.listing_urls)
+        assert sorted(scraper.extracted) == ["item1", "item2", "item3"]
+        assert set(results) == set(
+            [(f"processed:item{i}", f"item{i}") for i in range(1, 4)]
+        )
+        assert scraper.item_count == 3
+
+
+class MockBaseScraperBrokenKey(MockBaseScraperStreaming):
+    async def make_cache_key(self, item):
+        if item == "item3":
+            raise ValueError("no key for item3")
+        return item
+
+
+@pytest.mark.asyncio
+async def test_process_pipeline_failing_producer():
+    # a producer failing after its listing page still lets the others finish
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.oapiconfig = Configuration(host="http://localhost")
+    async with aiohttp.ClientSession() as session:
+        scraper = MockBaseScraperBrokenKey(config, uuid4(), ["slow", "fast"], session)
+        results = await scraper.process_pipeline(scraper.listing_urls)
+        assert sorted(scraper.extracted) == ["item1", "item2"]
+        assert set(results) == set(
+            [(f"processed:item{i}", f"item{i}") for i in range(1, 3)]
+        )
+
+
+@pytest.mark.asyncio
+async def test_send_result_unreachable(tmp_path):
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.api_obj_log = str(tmp_path)
+    # nothing listens on the discard port, so sending fails recoverably
+    config.oapiconfig = Configuration(host="http://localhost:9")
+    config.send_retries = 0
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=1)
+    ) as session:
+        scraper = MockVorgangsScraper(config, uuid4(), [], session)
+        assert await scraper.send_result(make_mock_vorgang()) is None
+        assert config.api_client() is config.api_client()
+
+
+@pytest.mark.asyncio
+async def test_send_result_retry(tmp_path, monkeypatch):
+    import openapi_client
+    import collector.interface
+
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.api_obj_log = str(tmp_path)
+    config.oapiconfig = Configuration(host="http://localhost")
+    monkeypatch.setattr(collector.interface, "SEND_BACKOFF_BASE_S", 0.001)
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=1)
+    ) as session:
+        scraper = MockVorgangsScraper(config, uuid4(), [], session)
+        # every request is sent with the configured timeout
+        config.send_timeout_s = 7
+        assert await scraper.call_backend(lambda api, timeout: timeout) == 7.0
+
+        responses = [
+            openapi_client.ApiException(status=503),
+            TimeoutError("timed out"),
+            None,
+        ]
+
+        async def call_backend(call):
+            response = responses.pop(0)
+            if response is not None:
+                raise response
+            return response
+
+        scraper.call_backend = call_backend
+        vg = make_mock_vorgang()
+        assert await scraper.send_result(vg) == vg
+        assert responses == []
+
+        # client errors are not retried. A 422 rejects the item for good, others
+        # (like a wrong url) keep it for later
+        responses = [openapi_client.ApiException(status=422), None]
+        with pytest.raises(ItemRejected):
+            await scraper.send_result(vg)
+        assert responses == [None]
+        responses = [openapi_client.ApiException(status=404), None]
+        assert await scraper.send_result(vg) is None
+        assert responses == [None]
+
+
+class MockBaseScraperUnsent(MockBaseScraperSuccess):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stored = []
+
+    async def make_cache_key(self, item):
+        return item
+
+    async def send_result(self, item):
+        if item == "processed:rejected":
+            raise ItemRejected("422 Unprocessable Entity")
+        return None if item == "processed:unsent" else item
+
+    async def store_extracted_result(self, item_key, result):
+        self.stored.append(item_key)
+
+
+@pytest.mark.asyncio
+async def test_background_sender():
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.oapiconfig = Configuration(host="http://localhost")
+    config.send_queue_size = 1
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=1)
+    ) as session:
+        scraper = MockBaseScraperUnsent(config, uuid4(), [], session)
+        results = await scraper.process_items(
+            ["sent1", "sent2", "unsent", "rejected", "None"]
+        )
+        assert set(results) == set(
+            [
+                ("processed:sent1", "sent1"),
+                ("processed:sent2", "sent2"),
+                (None, "unsent"),
+                (None, "rejected"),
+                None,
+            ]
+        )
+        # only acknowledged and rejected items end up in the cache, the
+        # rejected ones so they are not extracted again
+        assert sorted(scraper.stored) == ["rejected", "sent1", "sent2"]
+
+
+class MockBaseScraperOutbox(MockBaseScraperUnsent):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.backend_up = False
+
+    async def send_result(self, item):
+        return item if self.backend_up or item != "processed:unsent" else None
+
+    def serialize_result(self, result, item_key):
+        return result
+
+    def deserialize_result(self, payload, item_key):
+        return payload
+
+
+@pytest.mark.asyncio
+async def test_outbox(tmp_path):
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.oapiconfig = Configuration(host="http://localhost")
+    config.outbox_path = str(tmp_path / "outbox.sqlite")
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=1)
+    ) as session:
+        scraper = MockBaseScraperOutbox(config, uuid4(), [], session)
+        await scraper.process_items(["sent", "unsent"])
+        assert scraper.stored == ["sent"]
+        assert await scraper.is_deferred("unsent")
+
+        # deferred items are not extracted again
+        assert await scraper.process_items(["unsent"]) == []
+
+        # a new scraper instance (= a restart) sends them first
+        scraper = MockBaseScraperOutbox(config, uuid4(), [], session)
+        assert await scraper.drain_outbox() == [(None, "unsent")]
+        # however long the backend is down, the item is not given up on
+        for _ in range(5):
+            assert await scraper.drain_outbox() == [(None, "unsent")]
+        assert await config.outbox().entries("MockBaseScraperOutbox") == [
+            ("unsent", scraper.serialize_result("processed:unsent", "unsent"), 7)
+        ]
+        scraper.backend_up = True
+        assert await scraper.drain_outbox() == [("processed:unsent", "unsent")]
+        assert scraper.stored == ["unsent"]
+        assert not await scraper.is_deferred("unsent")
+        assert await scraper.drain_outbox() == []
+
+
 @pytest.mark.asyncio
 async def test_process_results():
     config = CollectorConfiguration()
@@ -116,41 +537,7 @@ async def test_log_object():
     config = CollectorConfiguration()
     config.load_only_env()
     config.oapiconfig = Configuration(host="http://localhost")
-    mock_vg = models.Vorgang.from_dict(
-        {
-            "api_id": str(uuid4()),
-            "titel": "TestTitel",
-            "kurztitel": "Kurztesttitel",
-            "wahlperiode": 27,
-            "verfassungsaendernd": False,
-            "typ": "gg-land-volk",
-            "ids": [models.VgIdent.from_dict({"typ": "initdrucks", "id": "27/512"})],
-            "initiatoren": [
-                models.Autor.from_dict(
-                    {"person": "Peter Zwegat", "organisation": "Die Linke"}
-                )
-            ],
-            "stationen": [
-                models.Station.from_dict(
-                    {
-                        "titel": "Testtitelstation",
-                        "zp_start": datetime.datetime.now().astimezone(datetime.UTC),
-                        "zp_modifiziert": datetime.datetime.now().astimezone(
-                            datetime.UTC
-                        ),
-                        "gremium": {
-                            "parlament": "BB",
-                            "name": "plenum",
-                            "wahlperiode": 19,
-                        },
-                        "typ": "preparl-regent",
-                        "trojanergefahr": 4,
-                        "dokumente": [],
-                    }
-                )
-            ],
-        }
-    )
+    mock_vg = make_mock_vorgang()
     nonexistent_path = "nonex_testpath/abc123"
     config.api_obj_log = nonexistent_path
     async with aiohttp.ClientSession(
@@ -0,0 +1,25 @@
+import pytest
+from collector.outbox import Outbox
+
+
+@pytest.mark.asyncio
+async def test_outbox_persistence(tmp_path):
+    path = tmp_path / "logs" / "outbox.sqlite"
+    outbox = Outbox(path)
+    # nothing is written until an item is put into it
+    assert await outbox.entries("Scraper") == []
+    assert not await outbox.contains("Scraper", "key")
+    assert not path.exists()
+
+    await outbox.put("Scraper", "key", "payload")
+    await outbox.put("Scraper", "key", "newer payload")
+    await outbox.put("OtherScraper", "key", "other payload")
+    await outbox.record_attempt("Scraper", "key")
+
+    reopened = Outbox(path)
+    assert await reopened.entries("Scraper") == [("key", "newer payload", 2)]
+    assert await reopened.contains("OtherScraper", "key")
+
+    await reopened.remove("Scraper", "key")
+    assert await Outbox(path).entries("Scraper") == []
+    assert await Outbox(path).entries("OtherScraper") == [("key", "other payload", 1)]
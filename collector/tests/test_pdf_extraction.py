@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collector import pdf_extraction
+from collector.config import CollectorConfiguration
+from collector.pdf_extraction import create_extraction_pool
+import os
+import pytest
+from uuid import uuid4
+
+
+def test_create_extraction_pool():
+    with create_extraction_pool("process", 2) as pool:
+        assert isinstance(pool, ProcessPoolExecutor)
+        # work runs outside of the collector process
+        assert pool.submit(os.getpid).result() != os.getpid()
+
+    with create_extraction_pool("thread", None) as pool:
+        assert isinstance(pool, ThreadPoolExecutor)
+        assert pool._max_workers == (os.cpu_count() or 1)
+
+    with create_extraction_pool("interpreter", 1) as pool:
+        # falls back to processes before python 3.14
+        assert pool.submit(sum, [1, 2]).result() == 3
+
+
+@pytest.mark.asyncio
+async def test_ocr_cache(tmp_path, monkeypatch):
+    config = CollectorConfiguration()
+    config.load_only_env()
+    doc_hash = uuid4().hex
+    ocr_runs = []
+
+    def extract_pdf(path, track_pages):
+        return "", {}, doc_hash, [""]
+
+    async def extract_ocr_text(path):
+        ocr_runs.append(path)
+        return "Gescannter Text"
+
+    monkeypatch.setattr(pdf_extraction, "extract_pdf", extract_pdf)
+    monkeypatch.setattr(pdf_extraction, "extract_ocr_text", extract_ocr_text)
+    for _ in range(2):
+        content, _, returned_hash = await pdf_extraction.extract_pdf_off_loop(
+            config, tmp_path / "scan.pdf"
+        )
+        assert (content, returned_hash) == ("Gescannter Text", doc_hash)
+    assert len(ocr_runs) == 1
+
+
+# the text kreuzberg extracted, with page boundaries as it records them
+def extracted(pages):
+    content = "\n\n".join(pages)
+    boundaries = []
+    offset = 0
+    for number, text in enumerate(pages, 1):
+        end = offset + len(text.encode("utf-8"))
+        boundaries.append(
+            {"byte_start": offset, "byte_end": end, "page_number": number}
+        )
+        offset = end + 2
+    return content, {"pages": {"boundaries": boundaries}}
+
+
+@pytest.mark.asyncio
+async def test_page_ocr(tmp_path, monkeypatch):
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.ocr_min_page_chars = 16
+    ocr_pages = []
+    pages = ["Anschreiben " * 10, "", "Begründung " * 10, "kurz"]
+    content, metadata = extracted(pages)
+
+    def extract_pdf(path, track_pages):
+        assert track_pages
+        # a new document every time, nothing is taken from the cache
+        return content, metadata, uuid4().hex, pages
+
+    async def extract_ocr_pages(path, pages):
+        ocr_pages.extend(pages)
+        return [f"Scan {page}" for page in pages]
+
+    monkeypatch.setattr(pdf_extraction, "extract_pdf", extract_pdf)
+    monkeypatch.setattr(pdf_extraction, "extract_ocr_pages", extract_ocr_pages)
+    result, _, _ = await pdf_extraction.extract_pdf_off_loop(
+        config, tmp_path / "mixed.pdf"
+    )
+    # only the pages without text layer are OCR'd and spliced in, the text of the
+    # others is kept as it was extracted
+    assert ocr_pages == [2, 4]
+    assert result == extracted([pages[0], "Scan 2", pages[2], "Scan 4"])[0]
+
+    # without page boundaries the pages are joined
+    metadata.clear()
+    result, _, _ = await pdf_extraction.extract_pdf_off_loop(
+        config, tmp_path / "mixed.pdf"
+    )
+    assert result == "\n\n".join([pages[0], "Scan 2", pages[2], "Scan 4"])
+
+
+@pytest.mark.asyncio
+async def test_page_ocr_failure(tmp_path, monkeypatch):
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.ocr_min_page_chars = 16
+    doc_hash = uuid4().hex
+    ocr_results = {2: None, 4: None}
+    pages = ["Anschreiben " * 10, "", "Begründung " * 10, "kurz"]
+    content, metadata = extracted(pages)
+
+    def extract_pdf(path, track_pages):
+        return content, metadata, doc_hash, pages
+
+    async def extract_ocr_pages(path, pages):
+        return [ocr_results[page] for page in pages]
+
+    monkeypatch.setattr(pdf_extraction, "extract_pdf", extract_pdf)
+    monkeypatch.setattr(pdf_extraction, "extract_ocr_pages", extract_ocr_pages)
+    # OCR failing on every page keeps the extracted text
+    result, _, _ = await pdf_extraction.extract_pdf_off_loop(config, tmp_path / "a.pdf")
+    assert result == content
+
+    # pages OCR failed on keep their text, and as they are not cached they are
+    # tried again next time
+    ocr_results[2] = "Scan 2"
+    result, _, _ = await pdf_extraction.extract_pdf_off_loop(config, tmp_path / "a.pdf")
+    assert result == extracted([pages[0], "Scan 2", pages[2], "kurz"])[0]
+    ocr_results[4] = "Scan 4"
+    result, _, _ = await pdf_extraction.extract_pdf_off_loop(config, tmp_path / "a.pdf")
+    assert result == extracted([pages[0], "Scan 2", pages[2], "Scan 4"])[0]
+
+
+# pages are not looked at (nor tracked by kreuzberg) if ocr-min-page-chars is 0
+@pytest.mark.asyncio
+async def test_page_ocr_off(tmp_path, monkeypatch):
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.ocr_min_page_chars = 0
+
+    def extract_pdf(path, track_pages):
+        assert not track_pages
+        return "Anschreiben " * 10, {}, uuid4().hex, None
+
+    monkeypatch.setattr(pdf_extraction, "extract_pdf", extract_pdf)
+    result, _, _ = await pdf_extraction.extract_pdf_off_loop(config, tmp_path / "a.pdf")
+    assert result == "Anschreiben " * 10
+
+
+def test_splice_pages():
+    pages = ["Über", "zwei", "drei"]
+    content, metadata = extracted(pages)
+    assert pdf_extraction.splice_pages(content, metadata, pages, {}) == content
+    spliced = pdf_extraction.splice_pages(content, metadata, pages, {0: "Eins"})
+    assert spliced == "Eins\n\nzwei\n\ndrei"
+    spliced = pdf_extraction.splice_pages(content, {}, pages, {2: "Drei"})
+    assert spliced == "Über\n\nzwei\n\nDrei"
@@ -1,6 +1,20 @@
 import asyncio
-from collector.scrapercache import ScraperCache
+import sys
+import time
+import json
+from collector.cache_backend import SqliteBackend
+from collector.scrapercache import (
+    CODEC_MARKERS,
+    DEFAULT_TTL_MIN,
+    LocalTier,
+    ScraperCache,
+    SyncScraperCache,
+    decode_value,
+    encode_value,
+    resolve_codec,
+)
 from collector.document_builder import DocumentBuilder
+from collector.scrapers.by_dok import ByGesetzentwurf
 from collector.config import CollectorConfiguration
 from oapicode.openapi_client import Configuration
 from oapicode.openapi_client import models
@@ -47,25 +61,26 @@ def test_documents():
     config = CollectorConfiguration()
     config.load_only_env()
     config.oapiconfig = Configuration(host="http://localhost")
+    cache = SyncScraperCache(config.cache)
 
     mock_dok = MockDoc(None, "blub", "entwurf", config)
-    success = config.cache.store_dokument("blub", mock_dok)
+    success = cache.store_dokument("blub", mock_dok)
     assert not success, "Expected to not Store unprocessed Document object"
 
     asyncio.run(mock_dok.extract())
-    success = config.cache.store_dokument("blub", mock_dok)
+    success = cache.store_dokument("blub", mock_dok)
     assert success, "Expected to successfully store document"
-    returned = config.cache.get_dokument("blub")
+    returned = cache.get_dokument("blub")
     assert returned is not None, "Retrieval Failed, returned None"
     assert returned == mock_dok.to_json(), "Retrieved Document did not match stored one"
-    raw_ret = config.cache.get_raw("dok:blub")
+    raw_ret = cache.get_raw("dok:blub")
     assert (
         raw_ret is not None
     ), "Expected Raw Key to be dok:blub, but was unable to retrieve under that name"
 
 
 def test_vorgang():
-    cache = ScraperCache("localhost", 6379)
+    cache = SyncScraperCache(ScraperCache("localhost", 6379))
     config = CollectorConfiguration()
     config.oapiconfig = Configuration(host="http://localhost")
 
@@ -112,9 +127,17 @@ def test_vorgang():
         raw_ret is not None
     ), "Expected Raw Key to be vg:blub, but was unable to retrieve under that name"
 
+    # the fingerprint is stored beside the Vorgang
+    key = str(uuid.uuid4())
+    assert cache.get_vorgang_fingerprints([key, "blub"]) == [None, None]
+    assert cache.store_vorgang(key, mock_vg, fingerprint="abc")
+    assert cache.get_vorgang(key) == mock_vg
+    assert cache.store_vorgang("blub", mock_vg, fingerprint="def")
+    assert cache.get_vorgang_fingerprints([key, "blub"]) == ["abc", "def"]
+
 
 def test_website():
-    cache = ScraperCache("localhost", 6379)
+    cache = SyncScraperCache(ScraperCache("localhost", 6379))
     config = CollectorConfiguration()
     config.oapiconfig = Configuration(host="http://localhost")
 
@@ -128,3 +151,234 @@ def test_website():
     assert (
         raw_ret is not None
     ), "Expected Raw Key to be html:blub, but was unable to retrieve under that name"
+
+
+def test_ocr_text():
+    config = CollectorConfiguration()
+    config.load_only_env()
+    config.oapiconfig = Configuration(host="http://localhost")
+    cache = SyncScraperCache(config.cache)
+
+    assert cache.get_ocr_text("0123abcd") is None
+    assert cache.store_ocr_text("0123abcd", "Gescannter Text")
+    assert cache.get_ocr_text("0123abcd") == "Gescannter Text"
+
+
+def test_loops():
+    # every loop gets a client of its own, connections don't leak across cycles
+    cache = ScraperCache("localhost", 6379)
+
+    async def roundtrip(value):
+        assert await cache.store_raw("loop:key", value)
+        got = await cache.get_raw("loop:key")
+        await cache.close()
+        return got
+
+    assert asyncio.run(roundtrip("eins")) == "eins"
+    assert asyncio.run(roundtrip("zwei")) == "zwei"
+
+
+def test_many():
+    cache = SyncScraperCache(ScraperCache("localhost", 6379))
+    keys = [f"many:{uuid.uuid4()}" for _ in range(3)]
+
+    assert cache.get_many(keys) == [None, None, None]
+    assert cache.store_many({keys[0]: "eins", keys[2]: "drei"})
+    assert cache.get_many(keys) == ["eins", None, "drei"]
+    assert cache.get_many([]) == []
+    assert cache.exists_many(keys) == [True, False, True]
+    assert cache.exists_many([]) == []
+
+
+def test_expiry():
+    cache = ScraperCache("localhost", 6379, 60, ttl_min={"vg:": 5, "llm-response:": 0})
+    assert cache.expiry_s("vg:blub") == 5 * 60
+    assert cache.expiry_s("llm-response:blub") is None
+    assert cache.expiry_s("dok:blub") == DEFAULT_TTL_MIN["dok:"] * 60
+    assert cache.expiry_s("unknown:blub") == 60 * 60
+    assert cache.expiry_s("vg:blub", expiry=1) == 60
+
+    async def ttls():
+        try:
+            await cache.store_raw("vg:ttl", "{}")
+            await cache.store_raw("llm-response:ttl", "{}")
+            backend = cache.backend
+            return await backend.ttl("vg:ttl"), await backend.ttl("llm-response:ttl")
+        finally:
+            await cache.close()
+
+    vg_ttl, llm_ttl = asyncio.run(ttls())
+    assert 0 < vg_ttl <= 5 * 60
+    assert llm_ttl is None
+
+    # a default of 0 keeps keys without a prefix ttl forever
+    cache = ScraperCache("localhost", 6379, 0)
+    assert cache.expiry_s("unknown:blub") is None
+    assert cache.expiry_s("dok:blub") == DEFAULT_TTL_MIN["dok:"] * 60
+    assert cache.expiry_s("vg:blub") is None
+
+
+def test_memory_report():
+    cache = SyncScraperCache(ScraperCache("localhost", 6379))
+    prefix = f"report-{uuid.uuid4().hex}:"
+    cache.store_raw(f"{prefix}eins", "a" * 100)
+    cache.store_raw(f"{prefix}zwei", "b" * 50, expiry=0)
+
+    count, nbytes, persistent = cache.memory_report()[prefix]
+    assert count == 2
+    assert nbytes >= 150
+    assert persistent == 1
+
+
+def test_compression():
+    cache = ScraperCache("localhost", 6379, compression="zlib")
+    key = f"vg:{uuid.uuid4()}"
+    value = json.dumps({"volltext": "Der Landtag hat beschlossen. " * 500})
+
+    async def roundtrip():
+        try:
+            assert await cache.store_raw(key, value)
+            stored = await cache.backend.get(key)
+            # entries written without compression still read
+            await cache.backend.set(f"{key}:plain", value.encode(), None)
+            return stored, await cache.get_raw(key), await cache.get_raw(f"{key}:plain")
+        finally:
+            await cache.close()
+
+    stored, returned, plain = asyncio.run(roundtrip())
+    assert stored[:1] == CODEC_MARKERS["zlib"]
+    assert len(stored) < len(value) / 10
+    assert returned == value
+    assert plain == value
+
+    # short values and other prefixes stay as they are
+    assert encode_value("kurz", "zlib") == b"kurz"
+    assert cache.encode("llm-response:blub", value) == value.encode()
+    assert decode_value(encode_value(value, resolve_codec("auto"))) == value
+
+
+def test_local_tier():
+    tier = LocalTier(100)
+    tier.put("a", "A", 40)
+    tier.put("b", "B", 40)
+    assert tier.get("a") == "A"
+    # b is the least recently used one now
+    tier.put("c", "C", 40)
+    assert tier.get("b") is None
+    assert tier.get("a") == "A" and tier.get("c") == "C"
+    assert tier.bytes == 80
+    tier.put("huge", "H", 101)
+    assert tier.get("huge") is None
+    tier.invalidate("a")
+    assert tier.get("a") is None and tier.bytes == 40
+    assert (tier.hits, tier.misses) == (3, 3)
+
+
+def test_hydrated():
+    cache = ScraperCache("localhost", 6379)
+    key = f"llm-response:{uuid.uuid4()}"
+    hydrated = []
+
+    def hydrate(raw):
+        hydrated.append(raw)
+        return json.loads(raw)
+
+    async def reads():
+        try:
+            assert await cache.get_hydrated(key, hydrate) is None
+            await cache.store_raw(key, json.dumps({"titel": "eins"}))
+            first = await cache.get_hydrated(key, hydrate)
+            first["titel"] = "geändert"
+            second = await cache.get_hydrated(key, hydrate)
+            assert second == {"titel": "eins"}, "callers must get copies"
+            assert len(hydrated) == 1, "second read must come from the local tier"
+
+            await cache.store_raw(key, json.dumps({"titel": "zwei"}))
+            assert await cache.get_hydrated(key, hydrate) == {"titel": "zwei"}
+            assert len(hydrated) == 2
+            return cache.hit_rates()
+        finally:
+            await cache.close()
+
+    rates = asyncio.run(reads())
+    assert rates["local"] == (1, 3)
+    assert rates["backend"][0] == 2
+
+
+def test_sqlite_backend(tmp_path, monkeypatch):
+    path = tmp_path / "cache" / "cache.sqlite"
+    cache = SyncScraperCache(
+        ScraperCache(None, None, ttl_min={"vg:": 1}, backend=SqliteBackend(path))
+    )
+    value = json.dumps({"volltext": "Der Landtag hat beschlossen. " * 500})
+
+    assert cache.get_vorgang("blub") is None
+    assert cache.store_raw("vg:blub", value)
+    assert cache.store_many({"html:eins": "<html>1</html>", "dok:zwei": value})
+    assert cache.get_raw("vg:blub") == value
+    assert cache.get_many(["html:eins", "dok:drei", "dok:zwei"]) == [
+        "<html>1</html>",
+        None,
+        value,
+    ]
+    assert cache.has_vorgaenge(["blub", "bla"]) == [True, False]
+    report = cache.memory_report()
+    assert report["vg:"][:1] == (1,) and report["vg:"][2] == 0
+    assert report["html:"][0] == 1
+
+    # entries survive a restart, expired ones don't
+    cache = SyncScraperCache(ScraperCache(None, None, backend=SqliteBackend(path)))
+    assert cache.get_raw("html:eins") == "<html>1</html>"
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 2 * 60)
+    assert cache.get_raw("vg:blub") is None
+    assert cache.get_raw("html:eins") == "<html>1</html>"
+    assert cache.exists_many(["vg:blub", "html:eins"]) == [False, True]
+
+    assert cache.clear()
+    assert cache.get_raw("html:eins") is None
+
+
+def test_dokument_hydration(capsys):
+    config = CollectorConfiguration()
+    dok = ByGesetzentwurf(
+        models.Doktyp.ENTWURF, "https://example.com/a.pdf", None, config
+    )
+    dok.output = models.Dokument.from_dict(
+        {
+            "typ": "entwurf",
+            "titel": "Gesetzentwurf",
+            "volltext": "Der Landtag hat beschlossen.",
+            "autoren": [{"person": "Peter Zwegat", "organisation": "Die Linke"}],
+            "zp_modifiziert": "2025-11-08T00:00:00+00:00",
+            "zp_referenz": "2025-11-08T00:00:00+00:00",
+            "hash": "0123abcd",
+            "link": "https://example.com/a.pdf",
+        }
+    )
+    dok.tops = [{"nummer": 1}]
+
+    hydrated = dok.hydrate(dok.to_json())
+    assert hydrated.config is config, "hydration must reuse the caller's config"
+    assert hydrated.output == dok.output
+    assert hydrated.tops == dok.tops
+    assert capsys.readouterr().out == ""
+
+
+def test_config_zero(tmp_path, monkeypatch):
+    # 0 in the config file turns the local tier off and keeps keys forever
+    config_file = tmp_path / "collector.toml"
+    config_file.write_text("""
+[main]
+collector-uuid = "00000000-0000-0000-0000-000000000000"
+
+[cache]
+default-ttl-min = 0
+local-max-mib = 0
+""")
+    monkeypatch.setattr(sys, "argv", ["collector", "--config-file", str(config_file)])
+    config = CollectorConfiguration()
+    config.load()
+    assert config.cache_local_max_mib == 0
+    assert config.cache.local.max_bytes == 0
+    assert config.cache.expiry_s("unknown:blub") is None
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import pytest
+from pathlib import Path
+
+from collector import tesseract_wrapper
+
+
+def write_images(path, contents):
+    images = []
+    for i, content in enumerate(contents):
+        images.append(path / f"img-{i:03}.png")
+        images[-1].write_bytes(content)
+    return images
+
+
+@pytest.mark.asyncio
+async def test_img_to_txt(tmp_path, monkeypatch):
+    monkeypatch.setattr(tesseract_wrapper, "OCR_CONCURRENCY", 3)
+    monkeypatch.setattr(tesseract_wrapper, "OCR_BACKEND", "cli")
+    running = 0
+    max_running = 0
+
+    async def run_command(command, input=None):
+        nonlocal running, max_running
+        # images are handed over as files, never through memory
+        assert input is None
+        running += 1
+        max_running = max(max_running, running)
+        page = int(command[-2].read_bytes().decode())
+        # later pages finish first
+        await asyncio.sleep(0.01 * (10 - page))
+        running -= 1
+        return 0, f"Seite {page} ".encode()
+
+    monkeypatch.setattr(tesseract_wrapper, "run_command", run_command)
+    images = write_images(tmp_path, [str(page).encode() for page in range(10)])
+    strings = await tesseract_wrapper.img_to_txt(images)
+    assert strings == [f"Seite {page} " for page in range(10)]
+    assert max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_engine_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(tesseract_wrapper, "OCR_BACKEND", "auto")
+    monkeypatch.setattr(tesseract_wrapper, "tesserocr", object())
+    monkeypatch.setattr(tesseract_wrapper, "_tesserocr_loaded", True)
+
+    async def run_engine(img):
+        if img.read_bytes() == b"broken":
+            raise RuntimeError("engine failed")
+        return "engine "
+
+    async def run_command(command, input=None):
+        return 0, b"cli "
+
+    monkeypatch.setattr(tesseract_wrapper, "run_engine", run_engine)
+    monkeypatch.setattr(tesseract_wrapper, "run_command", run_command)
+    images = write_images(tmp_path, [b"page", b"broken", b"page"])
+    strings = await tesseract_wrapper.img_to_txt(images)
+    assert strings == ["engine ", "cli ", "engine "]
+
+    tesseract_wrapper.set_ocr_backend("cli")
+    assert await tesseract_wrapper.img_to_txt(images[:1]) == ["cli "]
+
+
+@pytest.mark.asyncio
+async def test_extract_ocr_pages(tmp_path, monkeypatch):
+    reserved = []
+
+    async def extract_ocr_text(pdf_path, page=None, reserve=None):
+        reserved.append(reserve)
+        if page == 2:
+            raise Exception("pdfimages failed")
+        return f"Scan {page}"
+
+    monkeypatch.setattr(tesseract_wrapper, "extract_ocr_text", extract_ocr_text)
+    pdf = tmp_path / "mixed.pdf"
+    pdf.write_bytes(b"0" * 300)
+    texts = await tesseract_wrapper.extract_ocr_pages(pdf, [1, 2, 3])
+    # a failing page does not take the others with it
+    assert texts == ["Scan 1", None, "Scan 3"]
+    # the pages share what the whole pdf would reserve
+    assert reserved == [100 * tesseract_wrapper.SCRATCH_ESTIMATE_FACTOR] * 3
+
+
+# the images pdfimages wrote are OCR'd from the scratch directory, which is only
+# removed afterwards
+@pytest.mark.asyncio
+async def test_extract_ocr_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(tesseract_wrapper, "OCR_BACKEND", "cli")
+    scratch = []
+
+    async def run_command(command, input=None):
+        if command[0] == "pdfimages":
+            prefix = Path(command[-1])
+            scratch.append(prefix.parent)
+            write_images(
+                prefix.parent, [b"Seite eins " * 10, b"klein", b"Seite zwei " * 5]
+            )
+            return 0, b""
+        return 0, command[-2].read_bytes()
+
+    monkeypatch.setattr(tesseract_wrapper, "run_command", run_command)
+    pdf = tmp_path / "scan.pdf"
+    pdf.write_bytes(b"0" * 300)
+    # the tiny image is dropped
+    text = await tesseract_wrapper.extract_ocr_text(pdf)
+    assert text == "Seite eins " * 10 + "Seite zwei " * 5
+    assert not scratch[0].exists()
+    assert tesseract_wrapper.scratch_quota().used == 0
+
+
+@pytest.mark.asyncio
+async def test_scratch_quota():
+    quota = tesseract_wrapper.ScratchQuota(100)
+    order = []
+
+    async def use(name, nbytes):
+        async with quota.scratch_dir(nbytes) as path:
+            (path / "img-000.png").write_bytes(b"0" * nbytes)
+            order.append(f"+{name}")
+            await asyncio.sleep(0.01)
+            order.append(f"-{name}")
+        assert not path.exists()
+
+    await asyncio.gather(use("a", 60), use("b", 60), use("huge", 500))
+    # no two reservations exceeding the quota overlap
+    assert order == ["+a", "-a", "+b", "-b", "+huge", "-huge"]
+    assert quota.used == 0
+
+
+def test_check_availability(tmp_path, monkeypatch):
+    calls = tmp_path / "calls"
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    scripts = {
+        "tesseract": 'if [ "$1" = "--version" ]; then echo "tesseract 5.3.0"; '
+        'else printf "List of available languages (2):\\ndeu\\neng\\n"; fi',
+        "pdfimages": 'echo "pdfimages version 22.02.0" >&2',
+    }
+    for binary, script in scripts.items():
+        path = bindir / binary
+        path.write_text(f"#!/bin/sh\necho {binary} >> {calls}\n{script}\n")
+        path.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bindir))
+    monkeypatch.setattr(tesseract_wrapper, "_availability", {})
+    monkeypatch.setattr(
+        tesseract_wrapper, "TOOLCHAIN_CACHE", tmp_path / "cache" / "toolchain.json"
+    )
+
+    assert tesseract_wrapper.check_availability()
+    assert len(calls.read_text().split()) == 3
+    # memoized in the process
+    assert tesseract_wrapper.check_availability()
+    # and persisted across restarts
+    monkeypatch.setattr(tesseract_wrapper, "_availability", {})
+    assert tesseract_wrapper.check_availability()
+    assert len(calls.read_text().split()) == 3
+
+    # a changed binary is checked again
+    os.utime(bindir / "tesseract", ns=(0, 0))
+    assert tesseract_wrapper.check_availability()
+    assert len(calls.read_text().split()) == 6
+
+    (bindir / "pdfimages").unlink()
+    assert not tesseract_wrapper.check_availability()